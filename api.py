@@ -2,11 +2,21 @@
 Before running this file, please install the required dependencies:
 pip install fastapi uvicorn
 """
-from fastapi import FastAPI, HTTPException
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union
+
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from posture_detection import ExerciseDetector
+from pydantic import BaseModel
+from async_bridge import AsyncRelay
+from events import sinks_from_environment
+from sessions import DEFAULT_SESSION, IDLE_STATUS, SessionError, SessionManager
+from streaming import SKELETON_MESSAGE, sse_message
 import uvicorn
-import threading
 
 app = FastAPI()
 
@@ -20,36 +30,253 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-detector = None
-detector_thread = None
+# Set POSTURE_RECORDING_DIR to keep a replayable log of every session
+# POSTURE_EVENT_LOG and POSTURE_EVENT_WEBHOOK add event sinks (see events.py)
+# Clients may only start from video files under POSTURE_SOURCE_DIR, if set
+sessions = SessionManager(
+    recording_dir=os.environ.get("POSTURE_RECORDING_DIR"),
+    event_sinks=sinks_from_environment(),
+    source_dir=os.environ.get("POSTURE_SOURCE_DIR"),
+)
+
+# Starting and stopping detectors opens cameras and joins threads; that
+# happens here so the event loop keeps serving other clients meanwhile
+lifecycle_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lifecycle")
+
+# One relay per session and stream kind bridges the detector's threads to
+# asyncio; all of its subscribers share a single producer thread
+relays = {}
+
+NO_CACHE_HEADERS = {
+    "Cache-Control": "no-cache, no-store, must-revalidate",
+    "Pragma": "no-cache",
+    "Expires": "0",
+}
+
+
+class StartRequest(BaseModel):
+    exercise_type: str = "hand_raise"
+    source: Optional[Union[int, str]] = None  # Camera index, or a file under POSTURE_SOURCE_DIR
+    multi_person: bool = False  # Follow everyone in view, each with their own form state
+
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(lifecycle_executor, functools.partial(fn, *args, **kwargs))
+
+
+def get_relay(kind, session_id, options=()):
+    """The relay for a stream kind, session and (name, value) stream options"""
+    relay = relays.get((kind, session_id, options))
+    if relay is None:
+        params = dict(options)
+        if kind == "video":
+            relay = AsyncRelay(
+                f"video-{session_id}",
+                lambda: sessions.get(session_id).broadcaster.frames(idle_timeout=1.0, **params),
+                maxsize=1,
+            )
+        elif kind == "landmarks":
+            # Only the newest landmarks matter to a client drawing them
+            relay = AsyncRelay(
+                f"landmarks-{session_id}",
+                lambda: sessions.landmark_updates(session_id, timeout=1.0, **params),
+                maxsize=1,
+            )
+        else:
+            # Status events are small and must not be lost
+            relay = AsyncRelay(
+                f"status-{session_id}",
+                lambda: sessions.status_updates(session_id, timeout=1.0),
+                maxsize=32,
+            )
+        relays[(kind, session_id, options)] = relay
+    return relay
+
+
+def drop_relays(session_id):
+    """Forget a removed session's relays; running ones end with their subscribers"""
+    for key in [key for key in list(relays) if key[1] == session_id]:
+        relays.pop(key, None)
+
+
+sessions.on_remove = drop_relays
+
+
+def require_session(session_id):
+    """404 for sessions that /start never created; the default always exists"""
+    try:
+        sessions.check(session_id)
+    except SessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+def video_viewers(session_id):
+    return sum(
+        relay.subscribers for (kind, sid, _), relay in list(relays.items()) if kind == "video" and sid == session_id
+    )
+
+
+def current_status(session_id):
+    """The session's status in the same shape as streamed updates"""
+    session = sessions.find(session_id)
+    if session is None or session.detector is None:
+        return dict(IDLE_STATUS)
+    return session.detector.get_status()
+
+
+@app.on_event("startup")
+def startup():
+    # Load the pose model now rather than inside the first /start
+    sessions.prewarm()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    sessions.stop_all()
+    lifecycle_executor.shutdown(wait=False)
 
 
 @app.post("/start", status_code=200)
-async def start_detection():
-    global detector, detector_thread
-    if detector is not None and detector.running:
-        raise HTTPException(status_code=400, detail="Detection already running")
-    detector = ExerciseDetector()
-    detector_thread = threading.Thread(target=detector.start)
-    detector_thread.start()
-    return {"status": "Detection started"}
+@app.post("/sessions/{session_id}/start", status_code=200)
+async def start_detection(request: Optional[StartRequest] = None, session_id: str = DEFAULT_SESSION):
+    request = request or StartRequest()
+    try:
+        await run_blocking(
+            sessions.start,
+            session_id,
+            source=request.source,
+            exercise_type=request.exercise_type,
+            multi_person=request.multi_person,
+        )
+    except SessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {"status": "Detection started", "session_id": session_id}
 
 
 @app.post("/stop", status_code=200)
-async def stop_detection():
-    global detector, detector_thread
-    if detector is None or not detector.running:
-        raise HTTPException(status_code=400, detail="Detection not running")
-    detector.stop()
-    detector_thread.join()
-    detector = None
-    detector_thread = None
-    return {"status": "Detection stopped"}
+@app.post("/sessions/{session_id}/stop", status_code=200)
+async def stop_detection(session_id: str = DEFAULT_SESSION):
+    try:
+        await run_blocking(sessions.stop, session_id)
+    except SessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {"status": "Detection stopped", "session_id": session_id}
 
 
 @app.get("/status", status_code=200)
-async def get_status():
-    return {"running": detector is not None and detector.running}
+@app.get("/sessions/{session_id}/status", status_code=200)
+async def get_status(session_id: str = DEFAULT_SESSION):
+    session = sessions.find(session_id)
+    if session is None or session.detector is None:
+        # Same shape as a running session's status, like the Flask app
+        return dict(IDLE_STATUS, session_id=session_id)
+    return session.status()
+
+
+@app.get("/video_feed")
+@app.get("/sessions/{session_id}/video_feed")
+async def video_feed(
+    session_id: str = DEFAULT_SESSION,
+    width: Optional[int] = None,
+    quality: Optional[int] = None,
+    fps: Optional[int] = None,
+):
+    try:
+        # The default session may be watched before its first /start;
+        # other sessions must have been started
+        session = sessions.ensure(session_id)
+    except SessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if video_viewers(session_id) >= sessions.limits.max_viewers:
+        raise HTTPException(status_code=429, detail="Too many viewers for this session")
+    # Clients asking for the same normalised variant share one relay and encoder
+    variant = session.broadcaster.variant_key(width, quality, fps)
+    relay = get_relay("video", session_id, tuple(zip(("width", "quality", "fps"), variant)))
+    return StreamingResponse(
+        relay.stream(),
+        media_type="multipart/x-mixed-replace; boundary=frame",
+        headers=NO_CACHE_HEADERS,
+    )
+
+
+async def status_events(session_id):
+    """Server-Sent Events: the current status, then every change"""
+    yield sse_message("status", current_status(session_id))
+    async for update in get_relay("status", session_id).stream(keepalive=15):
+        if update is None:
+            # Comment line keeps proxies from closing the idle connection
+            yield ": keepalive\n\n"
+            continue
+        yield sse_message(*update)
+
+
+@app.get("/events")
+@app.get("/sessions/{session_id}/events")
+async def events(session_id: str = DEFAULT_SESSION):
+    require_session(session_id)
+    return StreamingResponse(
+        status_events(session_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def landmark_events(session_id, fps):
+    yield sse_message("skeleton", SKELETON_MESSAGE)
+    async for update in get_relay("landmarks", session_id, (("fps", fps),)).stream(keepalive=15):
+        if update is None:
+            yield ": keepalive\n\n"
+            continue
+        yield sse_message(*update)
+
+
+@app.get("/landmarks")
+@app.get("/sessions/{session_id}/landmarks")
+async def landmarks(session_id: str = DEFAULT_SESSION, fps: int = 15):
+    """Landmarks and feedback as Server-Sent Events, for clients that draw the skeleton"""
+    require_session(session_id)
+    return StreamingResponse(
+        landmark_events(session_id, min(max(fps, 1), 30)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/ws")
+@app.websocket("/sessions/{session_id}/ws")
+async def status_socket(websocket: WebSocket, session_id: str = DEFAULT_SESSION):
+    """Status and alarm events as JSON messages: {"event": ..., "data": ...}"""
+    try:
+        sessions.check(session_id)
+    except SessionError:
+        # Policy violation: the session was never started
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    try:
+        await websocket.send_json({"event": "status", "data": current_status(session_id)})
+        async for update in get_relay("status", session_id).stream(keepalive=15):
+            if update is None:
+                await websocket.send_json({"event": "keepalive"})
+                continue
+            event, data = update
+            await websocket.send_json({"event": event, "data": data})
+    except WebSocketDisconnect:
+        pass
+
+
+@app.get("/sessions", status_code=200)
+async def list_sessions():
+    return {
+        "sessions": [session.status() for session in sessions.sessions() if session.detector],
+        "stats": sessions.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(sessions.metrics_text(), media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
@@ -1,132 +1,157 @@
-import cv2
-import threading
-import numpy as np
-import time
+import os
 from flask import Flask, render_template, Response, request, jsonify
-from posture_detection import ExerciseDetector
+from rules import load_exercises
+from events import sinks_from_environment
+from sessions import DEFAULT_SESSION, IDLE_STATUS, SessionError, SessionManager
+from streaming import SKELETON_MESSAGE, sse_message
 
 app = Flask(__name__)
 
 # Global variables
-detector = None
-output_frame = None
-lock = threading.Lock()
+# Every monitored stream is a session; the unscoped routes use the
+# "default" session so the single-camera page keeps working
+# Set POSTURE_RECORDING_DIR to keep a replayable log of every session
+# POSTURE_EVENT_LOG and POSTURE_EVENT_WEBHOOK add event sinks (see events.py)
+# Clients may only start from video files under POSTURE_SOURCE_DIR, if set
+sessions = SessionManager(
+    recording_dir=os.environ.get("POSTURE_RECORDING_DIR"),
+    event_sinks=sinks_from_environment(),
+    source_dir=os.environ.get("POSTURE_SOURCE_DIR"),
+)
 
-def generate_frames():
-    global output_frame, detector
-    
-    # Create a black frame as placeholder with larger dimensions
-    black_frame = np.zeros((600, 800, 3), dtype=np.uint8)  # Updated dimensions
-    
-    while True:
-        try:
-            time.sleep(0.03)  # ~30 fps
-            with lock:
-                frame_to_display = output_frame.copy() if output_frame is not None else black_frame.copy()
-            
-            # Remove the color conversion to keep natural colors
-            ret, buffer = cv2.imencode('.jpg', frame_to_display, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            if not ret:
-                continue
-                
-            frame_bytes = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        except Exception as e:
-            print(f"Error in generate_frames: {e}")
+def status_events(session_id):
+    """Server-Sent Events stream that only emits when the status changes"""
+    for update in sessions.status_updates(session_id):
+        if update is None:
+            # Comment line keeps proxies from closing the idle connection
+            yield ": keepalive\n\n"
             continue
+        yield sse_message(*update)
 
-def update_frame():
-    global output_frame, detector
-    
-    frame_count = 0
-    last_log_time = time.time()
-    
-    while detector and detector.running:
-        try:
-            time.sleep(0.01)  # Reduce CPU usage
-            current_time = time.time()
-            
-            if detector.current_frame is not None:
-                with lock:
-                    output_frame = detector.current_frame.copy()
-                    frame_count += 1
-                
-                # Log frame rate every 5 seconds
-                if current_time - last_log_time > 5:
-                    fps = frame_count / (current_time - last_log_time)
-                    print(f"Frame update rate: {fps:.2f} fps")
-                    frame_count = 0
-                    last_log_time = current_time
-        except Exception as e:
-            print(f"Error in update_frame: {e}")
+@app.errorhandler(SessionError)
+def handle_session_error(error):
+    return jsonify({"status": str(error)}), error.status_code
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', exercises=load_exercises().values())
+
+@app.route('/video_feed', defaults={'session_id': DEFAULT_SESSION})
+@app.route('/sessions/<session_id>/video_feed')
+def video_feed(session_id):
+    # The default session may be watched before its first /start; other
+    # sessions must have been started (404 otherwise)
+    session = sessions.ensure(session_id)
+    if session.broadcaster.stats()["clients"] >= sessions.limits.max_viewers:
+        return jsonify({"status": "Too many viewers for this session"}), 429
+    # Optional ?width=&quality=&fps= pick a smaller or cheaper stream
+    frames = session.broadcaster.frames(
+        idle_timeout=1.0,
+        width=request.args.get('width', type=int),
+        quality=request.args.get('quality', type=int),
+        fps=request.args.get('fps', type=int),
+    )
+
+    def generate():
+        try:
+            for chunk in frames:
+                # While no frames flow, a bare CRLF (ignored after the last
+                # JPEG) is written each second so a viewer that went away
+                # is noticed and frees its slot
+                yield b'\r\n' if chunk is None else chunk
+        finally:
+            frames.close()
 
-@app.route('/video_feed')
-def video_feed():
     # Set response headers to prevent caching
-    response = Response(generate_frames(),
+    response = Response(generate(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
     response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '0'
     return response
 
-@app.route('/start', methods=['POST'])
-def start_detection():
-    global detector, output_frame
-    exercise_type = request.json.get('exercise_type', 'hand_raise')
-    
-    if detector is not None and detector.running:
-        return jsonify({"status": "Detection already running"})
-    
-    # Clear previous frame
-    output_frame = None
-    
-    detector = ExerciseDetector()
-    detector.exercise_type = exercise_type
-    detector.start()
+@app.route('/events', defaults={'session_id': DEFAULT_SESSION})
+@app.route('/sessions/<session_id>/events')
+def events(session_id):
+    sessions.check(session_id)
+    response = Response(status_events(session_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/landmarks', defaults={'session_id': DEFAULT_SESSION})
+@app.route('/sessions/<session_id>/landmarks')
+def landmarks(session_id):
+    """Landmarks and feedback as Server-Sent Events, for clients that draw the skeleton"""
+    sessions.check(session_id)
+    fps = min(max(request.args.get('fps', 15, type=int), 1), 30)
+
+    def generate():
+        yield sse_message("skeleton", SKELETON_MESSAGE)
+        for update in sessions.landmark_updates(session_id, fps=fps):
+            if update is None:
+                yield ": keepalive\n\n"
+                continue
+            yield sse_message(*update)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/start', methods=['POST'], defaults={'session_id': DEFAULT_SESSION})
+@app.route('/sessions/<session_id>/start', methods=['POST'])
+def start_detection(session_id):
+    body = request.get_json(silent=True) or {}
+    exercise_type = body.get('exercise_type', 'hand_raise')
+    # Camera index, or a file under POSTURE_SOURCE_DIR; defaults to the webcam
+    source = body.get('source')
+    # Follow everyone in view, each with their own form and rep state
+    multi_person = bool(body.get('multi_person', False))
     
-    # Start a thread to update frames
-    frame_thread = threading.Thread(target=update_frame, daemon=True)
-    frame_thread.start()
+    try:
+        sessions.start(session_id, source=source, exercise_type=exercise_type, multi_person=multi_person)
+    except SessionError as e:
+        if e.status_code != 400:
+            raise
+        return jsonify({"status": str(e)})
     
-    return jsonify({"status": "Detection started"})
+    return jsonify({"status": "Detection started", "session_id": session_id})
 
-@app.route('/stop', methods=['POST'])
-def stop_detection():
-    global detector, output_frame
-    
-    if detector is None or not detector.running:
+@app.route('/stop', methods=['POST'], defaults={'session_id': DEFAULT_SESSION})
+@app.route('/sessions/<session_id>/stop', methods=['POST'])
+def stop_detection(session_id):
+    session = sessions.find(session_id)
+    if session is None or not session.running:
         return jsonify({"status": "Detection not running"})
     
-    detector.stop()
-    output_frame = None
+    sessions.stop(session_id)
     
-    return jsonify({"status": "Detection stopped"})
+    return jsonify({"status": "Detection stopped", "session_id": session_id})
 
-@app.route('/status', methods=['GET'])
-def get_status():
-    global detector
-    
-    if detector is None:
-        return jsonify({
-            "running": False,
-            "feedback": "",
-            "angle": "",
-            "exercise_type": ""
-        })
+@app.route('/status', methods=['GET'], defaults={'session_id': DEFAULT_SESSION})
+@app.route('/sessions/<session_id>/status', methods=['GET'])
+def get_status(session_id):
+    session = sessions.find(session_id)
+    if session is None or session.detector is None:
+        return jsonify(dict(IDLE_STATUS, session_id=session_id))
     
+    return jsonify(session.status())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(sessions.metrics_text(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/sessions', methods=['GET'])
+def list_sessions():
     return jsonify({
-        "running": detector.running,
-        "feedback": detector.feedback_text,
-        "angle": detector.angle_text,
-        "form_status": detector.form_status,
-        "exercise_type": detector.exercise_type
+        "sessions": [session.status() for session in sessions.sessions() if session.detector],
+        "stats": sessions.stats()
     })
 
 if __name__ == '__main__':
+    # The debug reloader re-runs this file in a child process that does the
+    # serving; only that one needs a warm model
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        sessions.prewarm()
     app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)
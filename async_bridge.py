@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+
+def _offer(queue, item):
+    """Put without blocking, dropping the oldest item when the queue is full"""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(item)
+
+
+class AsyncRelay:
+    """Fans the items of a blocking iterator out to asyncio subscribers.
+
+    One thread consumes the iterator (e.g. a broadcaster's MJPEG frames or a
+    session's status updates) while at least one subscriber is connected and
+    hands every item to each subscriber's queue on its event loop, so
+    coroutines never block on detector locks or conditions. The iterator
+    should yield None now and then while idle so the thread notices when the
+    last subscriber has gone. A subscriber that falls behind loses its
+    oldest items, like DropOldestQueue.
+    """
+
+    def __init__(self, name, source, maxsize=1):
+        self.name = name
+        self.source = source  # Called to create the blocking iterator
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._thread = None
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        queue = asyncio.Queue(self.maxsize)
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"relay-{self.name}", daemon=True)
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = [entry for entry in self._subscribers if entry[1] is not queue]
+
+    def _run(self):
+        iterator = self.source()
+        try:
+            for item in iterator:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                    subscribers = list(self._subscribers)
+                if item is None:
+                    continue
+                for loop, queue in subscribers:
+                    try:
+                        loop.call_soon_threadsafe(_offer, queue, item)
+                    except RuntimeError:
+                        # The subscriber's event loop has been closed
+                        self.unsubscribe(queue)
+        except Exception as e:
+            print(f"Error in relay {self.name}: {e}")
+        finally:
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    async def stream(self, keepalive=None):
+        """Async generator of relayed items; yields None after `keepalive` idle seconds"""
+        queue = self.subscribe()
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.unsubscribe(queue)
@@ -0,0 +1,97 @@
+import os
+import sys
+import threading
+
+DEFAULT_ALARM_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "alarm.wav")
+
+
+class AlarmSound:
+    """An alarm sound read from disk once and replayed from memory.
+
+    Playback uses simpleaudio when it is installed (decoded once, plays
+    without blocking), winsound on Windows and playsound otherwise. The
+    player modules are imported on first use so headless servers never
+    need them; without a sound file or any player the terminal bell rings.
+    play() never blocks: the winsound and playsound fallbacks run on a
+    player thread, and an alarm raised while one is still playing is
+    skipped.
+    """
+
+    def __init__(self, path=DEFAULT_ALARM_PATH):
+        self.path = path
+        self.data = None  # Raw file bytes, for winsound
+        self._wave = None  # Decoded simpleaudio.WaveObject
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._playing = False  # A blocking fallback is playing on its thread
+
+    def load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            print(f"Warning: alarm.wav not found at {self.path}. Using the terminal bell.")
+            return
+        with open(self.path, "rb") as f:
+            self.data = f.read()
+        try:
+            import simpleaudio
+
+            self._wave = simpleaudio.WaveObject.from_wave_file(self.path)
+        except Exception:
+            # Not installed, or not a format it can decode
+            self._wave = None
+
+    def play(self):
+        """Start the alarm and return; False if the previous one is still playing"""
+        self.load()
+        if self._wave is not None:
+            try:
+                self._wave.play()
+            except Exception as e:
+                print(f"Error playing sound: {e}")
+                print("\a", end="", flush=True)
+            return True
+        if self.data is None:
+            print("\a", end="", flush=True)
+            return True
+        with self._lock:
+            if self._playing:
+                return False
+            self._playing = True
+        threading.Thread(target=self._play_blocking, name="alarm-player", daemon=True).start()
+        return True
+
+    def _play_blocking(self):
+        try:
+            if sys.platform == "win32":
+                import winsound
+
+                # SND_MEMORY cannot be combined with SND_ASYNC
+                winsound.PlaySound(self.data, winsound.SND_MEMORY)
+            else:
+                from playsound import playsound
+
+                playsound(self.path)
+        except Exception as e:
+            print(f"Error playing sound: {e}")
+            print("\a", end="", flush=True)
+        finally:
+            with self._lock:
+                self._playing = False
+
+
+_sounds = {}
+
+
+def load_alarm_sound(alarm_path=DEFAULT_ALARM_PATH):
+    """The shared AlarmSound for a file"""
+    sound = _sounds.get(alarm_path)
+    if sound is None:
+        sound = _sounds[alarm_path] = AlarmSound(alarm_path)
+    return sound
+
+
+def play_alarm_sound(alarm_path=DEFAULT_ALARM_PATH):
+    """Play the alarm, reading the file only the first time"""
+    load_alarm_sound(alarm_path).play()
@@ -0,0 +1,244 @@
+"""
+Offline scoring of recorded sessions.
+
+    python -m posture_detection analyze session1.mp4 session2.mp4 --workers 4
+
+Videos (or chunks of one long video) are spread over a process pool where
+each worker owns its own MediaPipe Pose instance. For every input a
+columnar .npz (or .csv) file is written with one row per frame: angles,
+form status, rep count and phase, and alarm events.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import time
+
+import cv2
+import numpy as np
+
+from frame_sources import VideoFileSource
+from landmarks import ANGLE_NAMES, compute_angles, joint_visibility, landmarks_to_array
+from pose_cache import PoseCache
+from reps import RepCounter, count_reps
+from rules import RuleEvaluator, load_exercises
+from smoothing import LandmarkFilter
+
+# Numeric encoding of FormMonitor.form_status in the output columns
+FORM_STATUS_CODES = {"": 0, "good": 1, "bad": 2}
+
+# Chunks shorter than this are not worth the pose tracker warm-up cost
+MIN_CHUNK_FRAMES = 300
+
+_pose = None
+_cache_poses = False
+
+
+def _init_worker(cache_poses=False):
+    """Give each worker process its own Pose instance"""
+    global _pose, _cache_poses
+    import mediapipe as mp
+
+    _cache_poses = cache_poses
+
+    # One OpenCV thread per worker; parallelism comes from the pool
+    cv2.setNumThreads(1)
+    _pose = mp.solutions.pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+
+
+def analyze_segment(task):
+    """Score frames [start_frame, end_frame) of one video.
+
+    Returns (task, columns) where columns maps column names to equally long
+    arrays. Form state starts fresh at the beginning of every segment.
+    """
+    from posture_detection import SMOOTHED_BAD_FRAMES, FormMonitor
+
+    path, start_frame, end_frame, exercise_type = task
+    exercise = load_exercises()[exercise_type]
+    rules = RuleEvaluator(exercise)
+    if _pose is None:
+        _init_worker()
+    # Don't let tracking state leak from the previous segment
+    if hasattr(_pose, "reset"):
+        _pose.reset()
+
+    source = VideoFileSource(path, start_frame=start_frame, end_frame=end_frame)
+    if not source.open():
+        return task, None
+    fps = source.fps or 30.0
+
+    smoother = LandmarkFilter()
+    form_monitor = FormMonitor(bad_frames=SMOOTHED_BAD_FRAMES)
+    # Static stretches of a recording reuse the result of a similar frame
+    cache = PoseCache() if _cache_poses else None
+    frames, angles, detected, status, alarms, cached = [], [], [], [], [], []
+    no_angles = np.full(len(ANGLE_NAMES), np.nan, dtype=np.float32)
+
+    try:
+        while True:
+            frame_index = source.position
+            ret, frame = source.read()
+            if not ret:
+                break
+            hit = False
+            if cache is not None:
+                key, hit, landmarks = cache.lookup(frame)
+            if not hit:
+                image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                image_rgb.flags.writeable = False
+                results = _pose.process(image_rgb)
+                landmarks = landmarks_to_array(results.pose_landmarks) if results.pose_landmarks else None
+                if cache is not None:
+                    cache.store(key, landmarks)
+            cached.append(hit)
+
+            alarm = False
+            if landmarks is not None:
+                h, w, _ = frame.shape
+                landmarks = smoother.update(frame_index / fps, landmarks)
+                frame_angles = compute_angles(landmarks, w, h)
+                violated = rules.evaluate(frame_angles, joint_visibility(landmarks))
+                _, alarm = form_monitor.update(violated.any())
+                angles.append(frame_angles)
+                detected.append(True)
+            else:
+                angles.append(no_angles)
+                detected.append(False)
+
+            frames.append(frame_index)
+            status.append(FORM_STATUS_CODES[form_monitor.form_status])
+            alarms.append(alarm)
+    finally:
+        source.release()
+
+    frames = np.asarray(frames, dtype=np.int64)
+    columns = {
+        "frame": frames,
+        "time": (frames / fps).astype(np.float64),
+        "detected": np.asarray(detected, dtype=bool),
+        "form_status": np.asarray(status, dtype=np.uint8),
+        "alarm": np.asarray(alarms, dtype=bool),
+    }
+    if cache is not None:
+        columns["cached"] = np.asarray(cached, dtype=bool)
+    angle_matrix = np.asarray(angles, dtype=np.float32).reshape(-1, len(ANGLE_NAMES))
+    for i, name in enumerate(ANGLE_NAMES):
+        columns[f"{name}_angle"] = angle_matrix[:, i]
+    # Reps are counted per segment; merge_columns offsets later segments
+    counter = RepCounter.from_exercise(exercise)
+    if counter is not None:
+        columns["reps"], columns["phase"] = count_reps(
+            angle_matrix[:, counter.angle_index], columns["time"], counter
+        )
+    return task, columns
+
+
+def plan_tasks(paths, workers, exercise_type, min_chunk_frames=MIN_CHUNK_FRAMES):
+    """Split inputs into segments so every worker has something to do.
+
+    With at least as many files as workers each file is one task; otherwise
+    long videos are cut into frame ranges.
+    """
+    counts = {}
+    for path in paths:
+        cap = cv2.VideoCapture(path)
+        counts[path] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0) if cap.isOpened() else 0
+        cap.release()
+
+    tasks = []
+    chunks_per_file = 1 if len(paths) >= workers else -(-workers // len(paths))
+    for path in paths:
+        total = counts[path]
+        chunks = chunks_per_file
+        if total:
+            chunks = max(1, min(chunks, total // min_chunk_frames))
+        if chunks == 1 or not total:
+            tasks.append((path, 0, None, exercise_type))
+            continue
+        bounds = np.linspace(0, total, chunks + 1).astype(int)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            tasks.append((path, int(start), int(end), exercise_type))
+    return tasks
+
+
+def merge_columns(parts):
+    """Concatenate segment columns in frame order"""
+    parts = sorted(parts, key=lambda part: part["frame"][0] if len(part["frame"]) else 0)
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    if "reps" in columns:
+        # Each segment counts from zero; carry the running total across
+        offsets = np.cumsum([0] + [part["reps"][-1] if len(part["reps"]) else 0 for part in parts[:-1]])
+        columns["reps"] = columns["reps"] + np.repeat(offsets, [len(part["reps"]) for part in parts]).astype(np.int32)
+    return columns
+
+
+def write_columns(columns, out_path, fmt="npz"):
+    if fmt == "npz":
+        np.savez_compressed(out_path, **columns)
+        return
+    names = list(columns)
+    with open(out_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        writer.writerows(zip(*(columns[name].tolist() for name in names)))
+
+
+def analyze(paths, workers=None, exercise_type="hand_raise", out_dir=".", fmt="npz", cache_poses=False):
+    """Score every path and write one output file per input; returns their paths"""
+    workers = workers or os.cpu_count() or 1
+    tasks = plan_tasks(paths, workers, exercise_type)
+    print(f"Analyzing {len(paths)} file(s) as {len(tasks)} task(s) on {workers} worker(s)")
+
+    results = {path: [] for path in paths}
+    frame_total = 0
+    start_time = time.time()
+    with multiprocessing.Pool(min(workers, len(tasks)), initializer=_init_worker, initargs=(cache_poses,)) as pool:
+        for task, columns in pool.imap_unordered(analyze_segment, tasks):
+            if columns is None:
+                print(f"Could not open {task[0]}")
+                continue
+            results[task[0]].append(columns)
+            frame_total += len(columns["frame"])
+
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for path, parts in results.items():
+        if not parts:
+            continue
+        columns = merge_columns(parts)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        out_path = os.path.join(out_dir, f"{stem}.{fmt}")
+        write_columns(columns, out_path, fmt)
+        alarms = int(columns["alarm"].sum())
+        reps = int(columns["reps"][-1]) if "reps" in columns and len(columns["reps"]) else 0
+        print(f"{path}: {len(columns['frame'])} frames, {reps} rep(s), {alarms} alarm(s) -> {out_path}")
+        if "cached" in columns:
+            print(f"  {int(columns['cached'].sum())} frame(s) reused a cached pose")
+        written.append(out_path)
+
+    elapsed = time.time() - start_time
+    if elapsed > 0:
+        print(f"Processed {frame_total} frames in {elapsed:.1f}s ({frame_total / elapsed:.1f} fps)")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m posture_detection analyze",
+        description="Score recorded exercise videos offline",
+    )
+    parser.add_argument("files", nargs="+", help="video files to analyze")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--exercise", default="hand_raise", choices=sorted(load_exercises()))
+    parser.add_argument("--out", default=".", help="output directory")
+    parser.add_argument("--format", default="npz", choices=["npz", "csv"])
+    parser.add_argument("--cache", action="store_true", help="reuse pose results for near-identical frames")
+    args = parser.parse_args(argv)
+
+    written = analyze(args.files, args.workers, args.exercise, args.out, args.format, args.cache)
+    return 0 if len(written) == len(args.files) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
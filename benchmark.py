@@ -0,0 +1,435 @@
+"""
+Reproducible benchmarks for the detection pipeline; no camera needed.
+
+    python benchmark.py --out before.json
+    python benchmark.py --clip session.mp4 --out after.json --compare before.json
+
+Every benchmark runs on deterministic synthetic frames/landmarks (or on the
+given clips) and reports throughput, latency percentiles and peak RSS. The
+JSON output of two runs can be compared to spot regressions between
+commits.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from frame_sources import ArraySource, VideoFileSource
+from landmarks import (
+    LEFT_ELBOW,
+    LEFT_HIP,
+    LEFT_SHOULDER,
+    LEFT_WRIST,
+    NUM_LANDMARKS,
+    compute_angles,
+)
+from motion import MotionGate
+from pose_cache import PoseCache
+
+FRAME_SHAPE = (600, 800, 3)
+
+
+def synthetic_landmarks(count, seed=0):
+    """(count, 33, 4) landmark stream of a person raising and lowering the left arm"""
+    rng = np.random.default_rng(seed)
+    landmarks = np.empty((count, NUM_LANDMARKS, 4), dtype=np.float32)
+    landmarks[:, :, 0] = rng.uniform(0.35, 0.65, NUM_LANDMARKS)
+    landmarks[:, :, 1] = rng.uniform(0.2, 0.9, NUM_LANDMARKS)
+    landmarks[:, :, 2] = 0.0
+    landmarks[:, :, 3] = 0.95
+
+    phase = np.linspace(0, 8 * np.pi, count, dtype=np.float32)
+    swing = (np.sin(phase) + 1) / 2 * np.pi  # Arm angle from hanging down to straight up
+    landmarks[:, LEFT_SHOULDER, :2] = (0.55, 0.35)
+    landmarks[:, LEFT_HIP, :2] = (0.55, 0.65)
+    landmarks[:, LEFT_ELBOW, 0] = 0.55 + 0.12 * np.sin(swing)
+    landmarks[:, LEFT_ELBOW, 1] = 0.35 + 0.12 * np.cos(swing)
+    landmarks[:, LEFT_WRIST, 0] = 0.55 + 0.24 * np.sin(swing)
+    landmarks[:, LEFT_WRIST, 1] = 0.35 + 0.24 * np.cos(swing)
+    landmarks[:, :, :2] += rng.normal(0, 0.002, (count, NUM_LANDMARKS, 2)).astype(np.float32)
+    return landmarks
+
+
+def synthetic_frames(count, shape=FRAME_SHAPE, seed=0):
+    """Deterministic BGR frames: a noisy background with a moving stick figure"""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 90, shape, dtype=np.uint8)
+    landmarks = synthetic_landmarks(count, seed)
+    h, w = shape[:2]
+    for i in range(count):
+        frame = background.copy()
+        points = (landmarks[i, :, :2] * (w, h)).astype(np.int32).tolist()
+        for start, end in ((LEFT_HIP, LEFT_SHOULDER), (LEFT_SHOULDER, LEFT_ELBOW), (LEFT_ELBOW, LEFT_WRIST)):
+            cv2.line(frame, tuple(points[start]), tuple(points[end]), (200, 180, 160), 12)
+        cv2.circle(frame, (int(0.55 * w), int(0.25 * h)), 30, (200, 180, 160), -1)
+        yield frame
+
+
+def summarize(latencies, items=None, elapsed=None):
+    """Throughput and latency percentiles (ms) for a list of per-call seconds"""
+    latencies = np.asarray(latencies, dtype=np.float64)
+    elapsed = float(latencies.sum()) if elapsed is None else elapsed
+    items = len(latencies) if items is None else items
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) * 1000 if len(latencies) else (0, 0, 0)
+    return {
+        "items": items,
+        "seconds": round(elapsed, 4),
+        "per_second": round(items / elapsed, 2) if elapsed > 0 else None,
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+    }
+
+
+def time_calls(fn, args):
+    latencies = []
+    for arg in args:
+        started = time.perf_counter()
+        fn(arg)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def bench_calculate_angle(frames):
+    from posture_detection import ExerciseDetector
+
+    detector = ExerciseDetector(source=ArraySource(()))
+    landmarks = synthetic_landmarks(frames)
+    w, h = FRAME_SHAPE[1], FRAME_SHAPE[0]
+    points = landmarks[:, :, :2] * (w, h)
+
+    scalar = time_calls(
+        lambda p: detector.calculate_angle(p[LEFT_ELBOW], p[LEFT_SHOULDER], p[LEFT_HIP]), points
+    )
+    per_frame = time_calls(lambda lm: compute_angles(lm, w, h), landmarks)
+    started = time.perf_counter()
+    compute_angles(landmarks, w, h)
+    batched = time.perf_counter() - started
+    return {
+        "calculate_angle": summarize(scalar),
+        "compute_angles_per_frame": summarize(per_frame),
+        "compute_angles_batched": summarize([batched], items=frames, elapsed=batched),
+    }
+
+
+def bench_form_state(frames):
+    from posture_detection import FormMonitor
+    from rules import RuleEvaluator, load_exercises
+    from smoothing import LandmarkFilter
+
+    angles = compute_angles(synthetic_landmarks(frames), FRAME_SHAPE[1], FRAME_SHAPE[0])
+    exercises = load_exercises()
+    monitor = FormMonitor()
+    results = {"form_monitor": summarize(time_calls(lambda a: monitor.update(bool(a[0] < 150)), angles))}
+
+    smoother = LandmarkFilter()
+    stream = list(enumerate(synthetic_landmarks(frames)))
+    results["landmark_filter"] = summarize(time_calls(lambda item: smoother.update(item[0] / 30.0, item[1]), stream))
+
+    # Rule evaluation cost per exercise; should not grow with the rule count
+    for name, exercise in exercises.items():
+        rules = RuleEvaluator(exercise)
+        results[f"rules_{name}"] = summarize(time_calls(rules.evaluate, angles))
+    results["rules_batched_all_frames"] = summarize(
+        time_calls(lambda a: exercises["squat"].violations(a), [angles]), items=frames
+    )
+    return results
+
+
+def bench_preprocess(frames):
+    images = list(synthetic_frames(min(frames, 200)))
+    flip = time_calls(lambda f: cv2.flip(f, 1), images)
+    convert = time_calls(lambda f: cv2.cvtColor(f, cv2.COLOR_BGR2RGB), images)
+    copy = time_calls(lambda f: f.copy(), images)
+    # Thumbnail plus a vectorised cell-distance search over a full cache of distinct frames
+    cache = PoseCache(max_size=len(images))
+    for image in images:
+        cache.store(cache.lookup(image)[0], None)
+    lookup = time_calls(cache.lookup, images)
+    gate = MotionGate()
+    gate_check = time_calls(lambda f: gate.check(f, 0.0), images)
+    return {
+        "flip": summarize(flip),
+        "bgr_to_rgb": summarize(convert),
+        "frame_copy": summarize(copy),
+        "pose_cache_lookup": summarize(lookup),
+        "motion_gate": summarize(gate_check),
+    }
+
+
+def bench_draw(frames):
+    from overlay import OverlayRenderer
+    from pipeline import StatusSnapshot
+
+    count = min(frames, 200)
+    images = list(synthetic_frames(count))
+    landmarks = synthetic_landmarks(count)
+    snapshots = [
+        StatusSnapshot._make([None] * len(StatusSnapshot._fields))._replace(
+            angle=f"Shoulder Angle: {i % 180}", feedback="Good Form!", form_status="good"
+        )
+        for i in range(count)
+    ]
+
+    # A new inference for every frame: both layers are drawn each time
+    renderer = OverlayRenderer()
+    drawn = time_calls(lambda i: renderer.render(images[i], landmarks[i], snapshots[i]), range(count))
+    # Frames between inferences only composite the cached layers
+    cached = time_calls(lambda i: renderer.render(images[i], landmarks[-1], snapshots[-1]), range(count))
+    return {"draw_overlay": summarize(drawn), "composite_cached_overlay": summarize(cached)}
+
+
+def bench_mjpeg(frames):
+    from frame_buffer import FrameRingBuffer
+    from streaming import MJPEGBroadcaster
+
+    images = list(synthetic_frames(min(frames, 200)))
+    encode = time_calls(lambda f: cv2.imencode('.jpg', f, [cv2.IMWRITE_JPEG_QUALITY, 80]), images)
+
+    # Fan-out: four clients reading one broadcaster
+    ring = FrameRingBuffer(FRAME_SHAPE)
+    broadcaster = MJPEGBroadcaster(lambda: ring)
+    clients = [broadcaster.frames() for _ in range(4)]
+    latencies = []
+    for image in images:
+        started = time.perf_counter()
+        ring.write(image)
+        for client in clients:
+            next(client)
+        latencies.append(time.perf_counter() - started)
+    for client in clients:
+        client.close()
+    return {"jpeg_encode": summarize(encode), "mjpeg_fanout_4_clients": summarize(latencies)}
+
+
+def bench_events(frames):
+    """Cost on the detection thread of raising an event with a slow sink attached"""
+    import threading
+
+    from events import CallbackSink, EventBus
+
+    slow_sink = CallbackSink(lambda event: time.sleep(0.01))
+    bus = EventBus([slow_sink], rate_limits={})
+    emit = time_calls(lambda i: bus.emit("alarm", frame=i), range(frames))
+    bus.close()
+    # What every alarm used to cost: a new thread running the sink
+    spawn = time_calls(lambda i: threading.Thread(target=slow_sink, args=(None,), daemon=True).start(), range(frames))
+    return {"emit": summarize(emit), "thread_per_event": summarize(spawn), "bus": bus.stats()}
+
+
+def bench_people(frames):
+    """Person detection cost per frame size and association/bookkeeping per people count"""
+    from people import PersonDetector, box_iou
+
+    detector = PersonDetector()
+    results = {}
+    for width, height in ((640, 480), (1280, 720), (1920, 1080)):
+        images = [cv2.resize(frame, (width, height)) for frame in synthetic_frames(min(frames, 20))]
+        results[f"detect_{width}x{height}"] = summarize(time_calls(detector.detect, images))
+    rng = np.random.default_rng(0)
+    for people in (1, 4, 8):
+        boxes = rng.uniform(0, 400, (people, 4))
+        boxes[:, 2:] += boxes[:, :2]
+        results[f"iou_{people}_people"] = summarize(time_calls(lambda _: box_iou(boxes, boxes), range(frames)))
+    return results
+
+
+def detector_failure(summary):
+    """Why a finished detector run measured nothing, or None if it inferred frames"""
+    if summary["counters"].get("frames_inferred", 0):
+        return None
+    # e.g. the pose model could not be built and the detection thread died
+    return "the detector inferred no frames; see its log for the error"
+
+
+def bench_pipeline(frames, clips=()):
+    """Full ExerciseDetector run over synthetic frames and each clip"""
+    from posture_detection import ExerciseDetector
+
+    runs = {
+        "synthetic": (ArraySource(synthetic_frames(frames)), {}),
+        "synthetic_roi": (ArraySource(synthetic_frames(frames)), {"roi_tracking": True}),
+    }
+    for clip in clips:
+        runs[clip] = (VideoFileSource(clip), {})
+
+    results = {}
+    for name, (source, options) in runs.items():
+        detector = ExerciseDetector(source=source, **options)
+        started = time.perf_counter()
+        detector.start()
+        detector.detection_thread.join()
+        elapsed = time.perf_counter() - started
+        summary = detector.metrics.summary()
+        failure = detector_failure(summary)
+        if failure:
+            results[name] = {"skipped": failure}
+            continue
+        captured = summary["counters"].get("frames_captured", 0)
+        results[name] = {
+            "frames": captured,
+            "seconds": round(elapsed, 3),
+            "fps": round(captured / elapsed, 2) if elapsed > 0 else None,
+            "stages": summary["stages"],
+            "counters": summary["counters"],
+        }
+    return results
+
+
+IMPORT_CHECK = """
+import sys, time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started, "mediapipe" in sys.modules, "tkinter" in sys.modules)
+"""
+
+
+def bench_startup(frames):
+    """Import cost of the entry modules and cold vs prewarmed first-frame latency"""
+    from pose_pool import PosePool
+    from posture_detection import ExerciseDetector
+
+    results = {}
+    for module in ("posture_detection", "sessions", "app", "api"):
+        # A fresh interpreter each time so nothing is already imported
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_CHECK.format(module=module)],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if output.returncode != 0:
+            results[f"import_{module}"] = {"skipped": output.stderr.strip().splitlines()[-1]}
+            continue
+        seconds, mediapipe, tkinter = output.stdout.split()
+        results[f"import_{module}"] = {
+            "import_ms": round(float(seconds) * 1000, 1),
+            "loads_mediapipe": mediapipe == "True",
+            "loads_tkinter": tkinter == "True",
+        }
+
+    for name in ("cold", "prewarmed"):
+        pool = PosePool(max_size=1)
+        if name == "prewarmed":
+            try:
+                pool.prewarm()
+            except Exception as e:
+                results[f"first_frame_{name}"] = {"skipped": f"prewarm failed: {e}"}
+                continue
+        detector = ExerciseDetector(source=ArraySource(synthetic_frames(min(frames, 30))), pose_pool=pool)
+        detector.start()
+        detector.detection_thread.join()
+        summary = detector.metrics.summary()
+        failure = detector_failure(summary)
+        results[f"first_frame_{name}"] = {"skipped": failure} if failure else summary["stages"].get("first_frame", {})
+    return results
+
+
+BENCHMARKS = {
+    "calculate_angle": bench_calculate_angle,
+    "form_state": bench_form_state,
+    "preprocess": bench_preprocess,
+    "draw": bench_draw,
+    "mjpeg": bench_mjpeg,
+    "events": bench_events,
+    "people": bench_people,
+    "pipeline": bench_pipeline,
+    "startup": bench_startup,
+}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def run(names, frames, clips=()):
+    results = {"environment": environment(), "frames": frames, "benchmarks": {}}
+    for name in names:
+        print(f"Running {name}...")
+        try:
+            if name == "pipeline":
+                result = bench_pipeline(frames, clips)
+            else:
+                result = BENCHMARKS[name](frames)
+        except (ImportError, AttributeError) as e:
+            # e.g. no mediapipe on this machine
+            print(f"Skipping {name}: {e}")
+            result = {"skipped": str(e)}
+        results["benchmarks"][name] = result
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(baseline, current):
+    """Print metrics that moved by more than 5% between two result files"""
+    old = _flatten(baseline["benchmarks"])
+    new = _flatten(current["benchmarks"])
+    print(f"Comparing against {baseline['environment'].get('commit')}:")
+    for key in sorted(old.keys() & new.keys()):
+        if not old[key] or not key.endswith(("per_second", "fps", "_ms")):
+            continue
+        change = (new[key] - old[key]) / old[key]
+        if abs(change) >= 0.05:
+            print(f"  {key}: {old[key]} -> {new[key]} ({change:+.1%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the posture detection pipeline")
+    parser.add_argument("--frames", type=int, default=600, help="synthetic frames/landmarks per benchmark")
+    parser.add_argument("--clip", action="append", default=[], help="recorded clip for the pipeline benchmark")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="comma-separated benchmarks to run")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    names = [name for name in args.only.split(",") if name]
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    results = run(names, args.frames, args.clip)
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
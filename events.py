@@ -0,0 +1,186 @@
+import json
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# Minimum seconds between two delivered events of a kind; events in
+# between are coalesced into the next delivered one
+DEFAULT_RATE_LIMITS = {"alarm": 3.0}
+
+Event = namedtuple("Event", ["kind", "timestamp", "data", "coalesced"])
+
+
+def event_dict(event):
+    return {"event": event.kind, "timestamp": event.timestamp, "coalesced": event.coalesced, **event.data}
+
+
+class EventBus:
+    """Delivers form events (alarms, form changes, reps) to pluggable sinks.
+
+    emit() never blocks and never starts a thread: it rate-limits the
+    event and puts it on a bounded queue, dropping it if the queue is full.
+    One long-lived dispatcher thread, started on the first event, hands
+    each event to every sink in turn. A sink is any callable taking an
+    Event; a `kinds` attribute restricts it to those event kinds.
+    """
+
+    def __init__(self, sinks=(), maxsize=64, rate_limits=None, labels=None):
+        self.sinks = list(sinks)
+        self.rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.labels = labels or {}  # Added to every event's data, e.g. the session id
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last = {}  # (kind, person) -> monotonic time of the last accepted event
+        self._pending = {}  # (kind, person) -> events coalesced since then
+        self.emitted = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def add_sink(self, sink):
+        self.sinks = self.sinks + [sink]
+
+    def remove_sink(self, sink):
+        self.sinks = [s for s in self.sinks if s is not sink]
+
+    def emit(self, kind, **data):
+        """Queue an event for the sinks; returns False if it was coalesced or dropped"""
+        now = time.monotonic()
+        # Each person in multi-person mode is rate-limited separately
+        key = (kind, data.get("person"))
+        with self._lock:
+            self.emitted += 1
+            last = self._last.get(key)
+            if last is not None and now - last < self.rate_limits.get(kind, 0.0):
+                self._pending[key] = self._pending.get(key, 0) + 1
+                self.coalesced += 1
+                return False
+            self._last[key] = now
+            coalesced = self._pending.pop(key, 0)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch_loop, name="event-dispatcher", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(Event(kind, time.time(), dict(self.labels, **data), coalesced))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def _dispatch_loop(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                break
+            for sink in self.sinks:
+                kinds = getattr(sink, "kinds", None)
+                if kinds is not None and event.kind not in kinds:
+                    continue
+                try:
+                    sink(event)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Error in event sink {sink!r}: {e}")
+            self.delivered += 1
+
+    def close(self, timeout=1.0):
+        """Deliver what is queued, then stop the dispatcher"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def stats(self):
+        return {
+            "emitted": self.emitted,
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "sink_errors": self.errors,
+            "queued": self._queue.qsize(),
+        }
+
+
+class AudioSink:
+    """Plays the alarm sound; the file is read and decoded once"""
+
+    kinds = ("alarm",)
+
+    def __init__(self, alarm_path=None):
+        from audio import DEFAULT_ALARM_PATH, load_alarm_sound
+
+        self.sound = load_alarm_sound(alarm_path or DEFAULT_ALARM_PATH)
+
+    def __call__(self, event):
+        print("TRIGGERING ALARM SOUND NOW!")
+        self.sound.play()
+
+
+class LogSink:
+    """Appends every event as a JSON line to a file"""
+
+    kinds = None
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()  # One sink may serve several buses
+        self._file = None
+
+    def __call__(self, event):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(json.dumps(event_dict(event)) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class WebhookSink:
+    """POSTs each event as JSON to a (local) HTTP endpoint"""
+
+    def __init__(self, url, kinds=None, timeout=2.0):
+        self.url = url
+        self.kinds = kinds
+        self.timeout = timeout
+
+    def __call__(self, event):
+        from urllib import request
+
+        body = json.dumps(event_dict(event)).encode()
+        req = request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with request.urlopen(req, timeout=self.timeout) as response:
+            response.read()
+
+
+class CallbackSink:
+    """Calls fn(event) in the dispatcher thread, optionally for some kinds only"""
+
+    def __init__(self, fn, kinds=None):
+        self.fn = fn
+        self.kinds = kinds
+
+    def __call__(self, event):
+        self.fn(event)
+
+
+def sinks_from_environment(environ=None):
+    """Extra sinks configured by POSTURE_EVENT_LOG and POSTURE_EVENT_WEBHOOK"""
+    import os
+
+    environ = os.environ if environ is None else environ
+    sinks = []
+    if environ.get("POSTURE_EVENT_LOG"):
+        sinks.append(LogSink(environ["POSTURE_EVENT_LOG"]))
+    if environ.get("POSTURE_EVENT_WEBHOOK"):
+        sinks.append(WebhookSink(environ["POSTURE_EVENT_WEBHOOK"]))
+    return sinks
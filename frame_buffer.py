@@ -0,0 +1,142 @@
+import threading
+import time
+
+import numpy as np
+
+_HEADER_ALIGN = 64
+
+
+class FrameRingBuffer:
+    """Preallocated ring of frame slots shared between one producer and any
+    number of consumers.
+
+    The producer writes straight into the next slot and commits it with a
+    new sequence number; consumers get read-only views of the newest slot
+    instead of copies. A view stays valid until the producer wraps around to
+    the same slot again, so consumers that hold on to a view should confirm
+    with is_current(seq) afterwards and drop the result if it was
+    overwritten (a seqlock, in effect).
+
+    Pass name= to back the ring with multiprocessing.shared_memory so the
+    detector and the web server can run in separate processes: the
+    producer creates it (create=True) and consumers attach to it by name
+    (create=False) with the same shape and slot count.
+    """
+
+    def __init__(self, shape, slots=4, dtype=np.uint8, name=None, create=True):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+        self.shared = name is not None
+        self._shm = None
+        self._cond = threading.Condition()
+
+        # Header: per-slot sequence numbers, the latest committed sequence
+        # and per-slot capture timestamps
+        header_bytes = (slots + 1) * 8 + slots * 8
+        frames_offset = -(-header_bytes // _HEADER_ALIGN) * _HEADER_ALIGN
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        total_bytes = frames_offset + slots * frame_bytes
+
+        if self.shared:
+            from multiprocessing import shared_memory
+
+            if create:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=total_bytes)
+            else:
+                self._shm = shared_memory.SharedMemory(name=name)
+            buffer = self._shm.buf
+        else:
+            buffer = bytearray(total_bytes)
+
+        self._seqs = np.ndarray((slots + 1,), dtype=np.int64, buffer=buffer)
+        self._timestamps = np.ndarray((slots,), dtype=np.float64, buffer=buffer, offset=(slots + 1) * 8)
+        self._frames = np.ndarray(
+            (slots,) + self.shape, dtype=self.dtype, buffer=buffer, offset=frames_offset
+        )
+        if create:
+            self._seqs[:] = 0
+        self._writing = None
+
+    @property
+    def name(self):
+        return self._shm.name if self._shm is not None else None
+
+    @property
+    def latest_seq(self):
+        return int(self._seqs[self.slots])
+
+    def begin_write(self):
+        """Return a writable view of the next slot; call commit() when done"""
+        seq = self.latest_seq + 1
+        slot = seq % self.slots
+        # Mark the slot as being written so readers racing with us back off
+        self._seqs[slot] = -1
+        self._writing = (seq, slot)
+        return self._frames[slot]
+
+    def commit(self, timestamp=None):
+        """Publish the slot returned by begin_write(); returns its sequence number"""
+        seq, slot = self._writing
+        self._writing = None
+        self._timestamps[slot] = time.perf_counter() if timestamp is None else timestamp
+        self._seqs[slot] = seq
+        self._seqs[self.slots] = seq
+        with self._cond:
+            self._cond.notify_all()
+        return seq
+
+    def write(self, frame, timestamp=None):
+        """Copy a frame into the next slot and publish it"""
+        np.copyto(self.begin_write(), frame)
+        return self.commit(timestamp)
+
+    def latest(self):
+        """Return (seq, read-only view) of the newest frame, or (0, None)"""
+        seq = self.latest_seq
+        if seq <= 0:
+            return 0, None
+        slot = seq % self.slots
+        view = self._frames[slot].view()
+        view.flags.writeable = False
+        return seq, view
+
+    def timestamp(self, seq):
+        """Capture timestamp of a frame that is still in the ring, else None"""
+        slot = seq % self.slots
+        timestamp = float(self._timestamps[slot])
+        return timestamp if self._seqs[slot] == seq else None
+
+    def is_current(self, seq):
+        """True while the slot holding `seq` has not been overwritten"""
+        return seq > 0 and int(self._seqs[seq % self.slots]) == seq
+
+    def wait(self, after_seq, timeout=None):
+        """Block until a frame newer than after_seq is published.
+
+        Returns the latest sequence number, which equals after_seq on
+        timeout. Consumers in another process have no condition variable to
+        wait on, so they poll.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.latest_seq <= after_seq:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            if self.shared:
+                time.sleep(0.005 if remaining is None else min(0.005, remaining))
+            else:
+                with self._cond:
+                    if self.latest_seq <= after_seq:
+                        self._cond.wait(remaining)
+        return self.latest_seq
+
+    def close(self):
+        if self._shm is not None:
+            # Views into the buffer must go before the mapping can be closed
+            self._seqs = self._timestamps = self._frames = None
+            self._shm.close()
+
+    def unlink(self):
+        if self._shm is not None:
+            self._shm.unlink()
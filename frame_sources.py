@@ -0,0 +1,286 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+
+class FrameSource:
+    """Base class for anything ExerciseDetector can pull BGR frames from.
+
+    Subclasses implement open(), read() and release(). read() returns the
+    same (ret, frame) pair as cv2.VideoCapture.read(); a source that has run
+    out of frames sets `exhausted` so the detector can stop instead of
+    retrying forever.
+    """
+
+    # Webcams are mirrored so the user sees themselves like in a mirror;
+    # recorded footage is analysed as-is.
+    mirror = False
+    # Live sources may drop frames when the pipeline falls behind, offline
+    # sources must deliver every frame.
+    live = False
+
+    def __init__(self):
+        self.exhausted = False
+
+    def open(self):
+        return True
+
+    def read(self):
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+    def media_time(self):
+        """Seconds into the recording of the frame last read.
+
+        None for live sources, whose frames are timed as they arrive.
+        Offline sources decode faster than real time, so time-based
+        filters and tempos have to follow the media clock instead.
+        """
+        return None
+
+    def describe(self):
+        return self.__class__.__name__
+
+
+class WebcamSource(FrameSource):
+    """Local camera opened through cv2.VideoCapture"""
+
+    mirror = True
+    live = True
+
+    def __init__(self, indices=(0, 1, 2), width=800, height=600, fps=30):
+        super().__init__()
+        if isinstance(indices, int):
+            indices = (indices,)
+        self.indices = tuple(indices)
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.camera_index = None
+        self.cap = None
+
+    def open(self):
+        # isOpened() already reflects whether the device could be claimed,
+        # so probe the indices back to back instead of sleeping after each.
+        for camera_index in self.indices:
+            print(f"Trying camera index {camera_index}...")
+            cap = cv2.VideoCapture(camera_index)
+            if cap.isOpened():
+                self.cap = cap
+                self.camera_index = camera_index
+                print(f"Successfully opened camera with index {camera_index}")
+                break
+            cap.release()
+            print(f"Failed to open camera with index {camera_index}")
+
+        if self.cap is None:
+            return False
+
+        # Set camera resolution and properties for better performance
+        try:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+            print(f"Camera properties set: {self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)}x{self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)} @ {self.cap.get(cv2.CAP_PROP_FPS)} fps")
+        except Exception as e:
+            print(f"Warning: Could not set camera properties: {e}")
+        return True
+
+    def read(self):
+        if self.cap is None:
+            return False, None
+        return self.cap.read()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def describe(self):
+        return f"webcam:{self.camera_index}"
+
+
+class VideoFileSource(FrameSource):
+    """Recorded video file.
+
+    By default frames are decoded as fast as the CPU allows. With
+    realtime=True reads are paced to the file's own frame rate, which is
+    useful for replaying a session through the web UI.
+    """
+
+    def __init__(self, path, realtime=False, start_frame=0, end_frame=None):
+        super().__init__()
+        self.path = path
+        self.realtime = realtime
+        self.live = realtime
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.position = start_frame
+        self.fps = 0.0
+        self.frame_count = 0
+        self.cap = None
+        self._next_frame_time = None
+
+    def open(self):
+        # A finished source can be opened again for another run
+        self.exhausted = False
+        self._next_frame_time = None
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            print(f"Failed to open video file {self.path}")
+            self.cap = None
+            return False
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if self.start_frame:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+        self.position = self.start_frame
+        return True
+
+    def read(self):
+        if self.cap is None or self.exhausted:
+            return False, None
+        if self.end_frame is not None and self.position >= self.end_frame:
+            self.exhausted = True
+            return False, None
+
+        if self.realtime and self.fps > 0:
+            now = time.perf_counter()
+            if self._next_frame_time is None:
+                self._next_frame_time = now
+            elif self._next_frame_time > now:
+                time.sleep(self._next_frame_time - now)
+            self._next_frame_time += 1.0 / self.fps
+
+        ret, frame = self.cap.read()
+        if not ret:
+            self.exhausted = True
+            return False, None
+        self.position += 1
+        return True, frame
+
+    def media_time(self):
+        return (self.position - 1) / (self.fps or 30.0)
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def describe(self):
+        return f"file:{self.path}"
+
+
+class ImageDirectorySource(FrameSource):
+    """Directory of still images, read in sorted filename order"""
+
+    def __init__(self, directory, fps=0.0):
+        super().__init__()
+        self.directory = directory
+        self.fps = fps
+        self.live = fps > 0
+        self.paths = []
+        self.position = 0
+        self._next_frame_time = None
+
+    def open(self):
+        self.exhausted = False
+        self._next_frame_time = None
+        if not os.path.isdir(self.directory):
+            print(f"Image directory {self.directory} does not exist")
+            return False
+        self.paths = sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self.position = 0
+        return bool(self.paths)
+
+    def read(self):
+        while self.position < len(self.paths):
+            path = self.paths[self.position]
+            self.position += 1
+            if self.fps > 0:
+                now = time.perf_counter()
+                if self._next_frame_time is None:
+                    self._next_frame_time = now
+                elif self._next_frame_time > now:
+                    time.sleep(self._next_frame_time - now)
+                self._next_frame_time += 1.0 / self.fps
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is not None:
+                return True, frame
+            print(f"Skipping unreadable image {path}")
+        self.exhausted = True
+        return False, None
+
+    def media_time(self):
+        return (self.position - 1) / (self.fps or 30.0)
+
+    def describe(self):
+        return f"images:{self.directory}"
+
+
+class ArraySource(FrameSource):
+    """In-memory frames from any iterable or generator of HxWx3 uint8 arrays.
+
+    Handy for synthetic streams in benchmarks and for feeding frames that
+    were decoded elsewhere.
+    """
+
+    def __init__(self, frames, mirror=False, live=False, fps=30.0):
+        super().__init__()
+        self.frames = frames
+        self.mirror = mirror
+        self.live = live
+        self.fps = fps  # Frame rate the frames were taken at, for media_time()
+        self.position = 0
+        self._iterator = None
+
+    def open(self):
+        # Lists replay from the start; a spent generator stays empty
+        self.exhausted = False
+        self._iterator = iter(self.frames)
+        self.position = 0
+        return True
+
+    def read(self):
+        if self._iterator is None or self.exhausted:
+            return False, None
+        try:
+            frame = next(self._iterator)
+        except StopIteration:
+            self.exhausted = True
+            return False, None
+        self.position += 1
+        return True, np.ascontiguousarray(frame, dtype=np.uint8)
+
+    def media_time(self):
+        if self.live:
+            return None
+        return (self.position - 1) / (self.fps or 30.0)
+
+    def release(self):
+        self._iterator = None
+
+
+def open_source(spec, realtime=False):
+    """Build a FrameSource from a camera index, file path, directory or iterable"""
+    if isinstance(spec, FrameSource):
+        return spec
+    if spec is None:
+        return WebcamSource()
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return WebcamSource(indices=int(spec))
+    if isinstance(spec, str):
+        if os.path.isdir(spec):
+            return ImageDirectorySource(spec)
+        return VideoFileSource(spec, realtime=realtime)
+    return ArraySource(spec)
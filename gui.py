@@ -0,0 +1,168 @@
+"""
+Desktop GUI for the exercise form monitor.
+
+Tkinter and Pillow are only imported by this module, so servers that just
+need ExerciseDetector never load them.
+"""
+import threading
+import tkinter as tk
+from tkinter import ttk
+
+import cv2
+from PIL import Image, ImageTk
+
+from posture_detection import ExerciseDetector
+
+
+class ExerciseGUI:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Exercise Form Monitor")
+        self.root.geometry("800x600")
+        
+        # Create ExerciseDetector instance
+        self.detector = ExerciseDetector()
+        # Load the pose model while the window comes up so Start is quick
+        threading.Thread(target=self.detector.pose_pool.prewarm, name="pose-prewarm", daemon=True).start()
+        
+        # Create UI elements
+        self.create_widgets()
+        
+        # Update flag
+        self.is_updating = False
+        # (ring seq, size) of the frame on screen
+        self.shown = None
+        
+    def create_widgets(self):
+        # Top frame for controls
+        control_frame = ttk.Frame(self.root)
+        control_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        # Start/Stop button
+        self.start_stop_btn = ttk.Button(control_frame, text="Start", command=self.toggle_detection)
+        self.start_stop_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Exercise selection
+        ttk.Label(control_frame, text="Exercise:").pack(side=tk.LEFT, padx=5)
+        
+        self.exercise_var = tk.StringVar(value="hand_raise")
+        exercise_combo = ttk.Combobox(
+            control_frame, 
+            textvariable=self.exercise_var,
+            values=list(self.detector.exercises),
+            state="readonly",
+            width=15
+        )
+        exercise_combo.pack(side=tk.LEFT, padx=5)
+        exercise_combo.bind("<<ComboboxSelected>>", self.change_exercise)
+        
+        # Status labels
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        
+        self.angle_label = ttk.Label(status_frame, text="Angle: Not detected")
+        self.angle_label.pack(side=tk.LEFT, padx=5)
+        
+        self.reps_label = ttk.Label(status_frame, text="Reps: 0")
+        self.reps_label.pack(side=tk.LEFT, padx=5)
+        
+        self.feedback_label = ttk.Label(status_frame, text="")
+        self.feedback_label.pack(side=tk.RIGHT, padx=5)
+        
+        # Video frame
+        self.video_frame = ttk.Frame(self.root, borderwidth=2, relief="groove")
+        self.video_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        self.video_label = ttk.Label(self.video_frame)
+        self.video_label.pack(fill=tk.BOTH, expand=True)
+        
+        # Instructions label
+        instructions = (
+            "Instructions:\n"
+            "1. Select an exercise type from the dropdown menu\n"
+            "2. Click 'Start' to begin monitoring\n"
+            "3. Position yourself so your body is visible in the camera"
+        )
+        for number, exercise in enumerate(self.detector.exercises.values(), start=4):
+            instructions += f"\n{number}. For {exercise.label}: {exercise.instructions}"
+        
+        ttk.Label(self.root, text=instructions, justify=tk.LEFT).pack(
+            padx=10, pady=(0, 10), anchor=tk.W
+        )
+        
+    def update_video(self):
+        ring = self.detector.frame_buffer
+        if self.detector.running and ring is not None:
+            seq, frame = ring.latest()
+
+            # Resize to fit the frame if needed
+            frame_width = self.video_frame.winfo_width()
+            frame_height = self.video_frame.winfo_height()
+            size = (frame_width, frame_height) if frame_width > 1 and frame_height > 1 else None
+
+            # Only convert frames that are new or need a different size
+            if frame is not None and (seq, size) != self.shown:
+                self.shown = (seq, size)
+                if size is not None:
+                    # Area averaging for shrinking is much cheaper than Lanczos
+                    shrinking = frame_width < frame.shape[1]
+                    frame = cv2.resize(
+                        frame, size, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+                    )
+                # Frames are BGR; Pillow expects RGB
+                image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+                # Convert to Tkinter format
+                img_tk = ImageTk.PhotoImage(image=image)
+
+                # Update label
+                self.video_label.configure(image=img_tk)
+                self.video_label.image = img_tk
+
+            # Update status labels from one consistent snapshot
+            snapshot = self.detector.snapshot
+            self.angle_label.configure(text=snapshot.angle if snapshot.angle else "Angle: Not detected")
+            self.reps_label.configure(text=f"Reps: {snapshot.reps}")
+            
+            if snapshot.form_status == "good":
+                self.feedback_label.configure(text=snapshot.feedback, foreground="green")
+            elif snapshot.form_status == "bad":
+                self.feedback_label.configure(text=snapshot.feedback, foreground="red")
+            else:
+                self.feedback_label.configure(text="")
+                
+        # Schedule the next update
+        if self.is_updating:
+            self.root.after(30, self.update_video)
+    
+    def toggle_detection(self):
+        if not self.detector.running:
+            # Start detection
+            self.detector.start()
+            self.start_stop_btn.configure(text="Stop")
+            self.is_updating = True
+            self.update_video()
+        else:
+            # Stop detection
+            self.detector.stop()
+            self.start_stop_btn.configure(text="Start")
+            self.is_updating = False
+    
+    def change_exercise(self, event=None):
+        self.detector.exercise_type = self.exercise_var.get()
+        
+    def on_closing(self):
+        if self.detector.running:
+            self.detector.stop()
+        self.root.destroy()
+
+
+def main():
+    root = tk.Tk()
+    app = ExerciseGUI(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_closing)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import numpy as np
+
+NUM_LANDMARKS = 33
+
+# MediaPipe PoseLandmark indices, duplicated here so the angle engine can be
+# used for offline analysis without importing mediapipe
+NOSE = 0
+LEFT_SHOULDER = 11
+RIGHT_SHOULDER = 12
+LEFT_ELBOW = 13
+RIGHT_ELBOW = 14
+LEFT_WRIST = 15
+RIGHT_WRIST = 16
+LEFT_HIP = 23
+RIGHT_HIP = 24
+LEFT_KNEE = 25
+RIGHT_KNEE = 26
+LEFT_ANKLE = 27
+RIGHT_ANKLE = 28
+
+# Skeleton edges, the same pairs as mediapipe's POSE_CONNECTIONS
+POSE_CONNECTIONS = frozenset([
+    (0, 1), (1, 2), (2, 3), (3, 7), (0, 4), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (13, 15), (15, 17), (15, 19), (15, 21), (17, 19),
+    (12, 14), (14, 16), (16, 18), (16, 20), (16, 22), (18, 20),
+    (11, 23), (12, 24), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28),
+    (27, 29), (28, 30), (29, 31), (30, 32), (27, 31), (28, 32),
+])
+
+# Every joint angle we track, as (a, b, c) with the angle measured at b
+JOINT_ANGLES = {
+    "left_shoulder": (LEFT_ELBOW, LEFT_SHOULDER, LEFT_HIP),
+    "right_shoulder": (RIGHT_ELBOW, RIGHT_SHOULDER, RIGHT_HIP),
+    "left_elbow": (LEFT_WRIST, LEFT_ELBOW, LEFT_SHOULDER),
+    "right_elbow": (RIGHT_WRIST, RIGHT_ELBOW, RIGHT_SHOULDER),
+    "left_hip": (LEFT_SHOULDER, LEFT_HIP, LEFT_KNEE),
+    "right_hip": (RIGHT_SHOULDER, RIGHT_HIP, RIGHT_KNEE),
+    "left_knee": (LEFT_HIP, LEFT_KNEE, LEFT_ANKLE),
+    "right_knee": (RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE),
+}
+ANGLE_NAMES = tuple(JOINT_ANGLES)
+ANGLE_INDEX = {name: i for i, name in enumerate(ANGLE_NAMES)}
+
+_A, _B, _C = (np.array(indices, dtype=np.intp) for indices in zip(*JOINT_ANGLES.values()))
+
+
+def landmarks_to_array(pose_landmarks):
+    """Convert MediaPipe pose landmarks to a (33, 4) float32 array of
+    (x, y, z, visibility). Returns None when nothing was detected."""
+    if pose_landmarks is None:
+        return None
+    return np.array(
+        [(lm.x, lm.y, lm.z, lm.visibility) for lm in pose_landmarks.landmark],
+        dtype=np.float32,
+    )
+
+
+def angles_between(a, b, c):
+    """Angle at b in degrees for arrays of 2D points shaped (..., 2)"""
+    ba = a - b
+    bc = c - b
+    dot = np.einsum("...i,...i->...", ba, bc)
+    norm = np.sqrt(np.einsum("...i,...i->...", ba, ba) * np.einsum("...i,...i->...", bc, bc))
+    # Degenerate joints (two points on top of each other) report 0 degrees
+    cosine = np.divide(dot, norm, out=np.ones_like(dot), where=norm > 0)
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def compute_angles(landmarks, width=1.0, height=1.0):
+    """Compute every angle in JOINT_ANGLES in one batched call.
+
+    `landmarks` is a (33, 4) array for one frame or (N, 33, 4) for a batch.
+    Normalised coordinates are scaled by the frame size first so angles are
+    not distorted by the aspect ratio. Returns float32 angles in degrees
+    shaped (len(ANGLE_NAMES),) or (N, len(ANGLE_NAMES)), ordered like
+    ANGLE_NAMES.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    scale = np.array([width, height], dtype=np.float32)
+    xy = landmarks[..., :2] * scale
+    angles = angles_between(xy[..., _A, :], xy[..., _B, :], xy[..., _C, :])
+    return angles.astype(np.float32, copy=False)
+
+
+def joint_visibility(landmarks):
+    """Lowest visibility of the three landmarks that make up each angle"""
+    visibility = np.asarray(landmarks)[..., 3]
+    return np.minimum(np.minimum(visibility[..., _A], visibility[..., _B]), visibility[..., _C])
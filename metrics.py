@@ -0,0 +1,125 @@
+import threading
+import time
+
+import numpy as np
+
+
+class RollingHistogram:
+    """Keeps the most recent `size` samples of a latency for percentiles.
+
+    Each histogram has a single writer (the stage's own thread), so
+    observe() takes no lock; a reader racing with it may at worst see one
+    sample from the previous lap of the ring.
+    """
+
+    def __init__(self, size=1024):
+        self._samples = np.zeros(size, dtype=np.float64)
+        self._next = 0
+        self.count = 0  # Samples observed since startup
+        self.sum = 0.0
+
+    def observe(self, value):
+        self._samples[self._next] = value
+        self._next = (self._next + 1) % len(self._samples)
+        self.count += 1
+        self.sum += value
+
+    def percentiles(self, quantiles=(50, 95, 99)):
+        filled = min(self.count, len(self._samples))
+        if not filled:
+            return {q: None for q in quantiles}
+        values = np.percentile(self._samples[:filled], quantiles)
+        return dict(zip(quantiles, values.tolist()))
+
+
+class PipelineMetrics:
+    """Per-stage latency histograms and event counters for one detector"""
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(stage, RollingHistogram(self.size))
+        return histogram
+
+    def observe(self, stage, seconds):
+        self.histogram(stage).observe(seconds)
+
+    def since(self, stage, started):
+        """Record the time elapsed since `started` (a perf_counter value)"""
+        self.histogram(stage).observe(time.perf_counter() - started)
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def summary(self):
+        """Millisecond percentiles per stage plus counters, for JSON status"""
+        stages = {}
+        for stage, histogram in list(self.stages.items()):
+            percentiles = histogram.percentiles()
+            stages[stage] = {
+                f"p{q}_ms": None if v is None else round(v * 1000, 2) for q, v in percentiles.items()
+            }
+            stages[stage]["count"] = histogram.count
+        with self._lock:
+            counters = dict(self.counters)
+        return {"stages": stages, "counters": counters}
+
+
+def _labels(labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def render_prometheus(entries):
+    """Render metrics in the Prometheus text exposition format.
+
+    `entries` is an iterable of (labels, PipelineMetrics, pipeline_stats)
+    tuples, typically one per session; pipeline_stats is the dict returned
+    by ExerciseDetector.pipeline_stats() and may be None.
+    """
+    latency = []
+    counters = {}
+    queue_depth = []
+    queue_dropped = []
+    for labels, metrics, pipeline in entries:
+        for stage, histogram in list(metrics.stages.items()):
+            stage_labels = dict(labels, stage=stage)
+            for q, value in histogram.percentiles().items():
+                if value is not None:
+                    quantile_labels = _labels(dict(stage_labels, quantile=q / 100))
+                    latency.append(f"posture_stage_latency_seconds{{{quantile_labels}}} {value:.6f}")
+            latency.append(f"posture_stage_latency_seconds_sum{{{_labels(stage_labels)}}} {histogram.sum:.6f}")
+            latency.append(f"posture_stage_latency_seconds_count{{{_labels(stage_labels)}}} {histogram.count}")
+        for name, value in sorted(metrics.counters.items()):
+            counters.setdefault(name, []).append(f"posture_{name}_total{{{_labels(labels)}}} {value}")
+        for name, stats in (pipeline or {}).items():
+            # Only the frame queues report a depth; other stats (the event
+            # bus) also count drops but are not queues of frames
+            if not isinstance(stats, dict) or "depth" not in stats:
+                continue
+            queue_labels = _labels(dict(labels, queue=name))
+            queue_depth.append(f"posture_queue_depth{{{queue_labels}}} {stats['depth']}")
+            queue_dropped.append(f"posture_queue_dropped_total{{{queue_labels}}} {stats['dropped']}")
+
+    lines = [
+        "# HELP posture_stage_latency_seconds Rolling latency of each pipeline stage",
+        "# TYPE posture_stage_latency_seconds summary",
+        *latency,
+        "# HELP posture_queue_depth Frames waiting in a pipeline queue",
+        "# TYPE posture_queue_depth gauge",
+        *queue_depth,
+        "# HELP posture_queue_dropped_total Frames dropped by a pipeline queue",
+        "# TYPE posture_queue_dropped_total counter",
+        *queue_dropped,
+    ]
+    for name, samples in sorted(counters.items()):
+        lines.append(f"# TYPE posture_{name}_total counter")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
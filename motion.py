@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Idles pose inference while nothing in the frame changes.
+
+    Every frame is reduced to a small grey thumbnail and compared with the
+    thumbnail of the last frame that was inferred. While the scene stays the
+    same (an empty room, someone resting between sets) the gate goes idle
+    and only lets a keep-alive frame through every `keepalive_interval`
+    seconds; any motion re-opens it at once.
+    """
+
+    def __init__(
+        self,
+        size=(64, 48),
+        pixel_threshold=15,
+        min_changed=0.002,
+        idle_after=1.0,
+        keepalive_interval=1.0,
+    ):
+        self.size = size  # Thumbnail (width, height)
+        self.pixel_threshold = pixel_threshold  # Grey levels a pixel must change by
+        self.min_changed = min_changed  # Fraction of changed pixels that counts as motion
+        self.idle_after = idle_after  # Seconds without motion before going idle
+        self.keepalive_interval = keepalive_interval  # Inference interval while idle
+        self.reset()
+
+    def reset(self):
+        self.reference = None
+        self.last_motion = None
+        self.last_pass = None
+        self.state = "active"
+        self.passed = 0
+        self.gated = 0
+
+    def _thumbnail(self, frame):
+        # Strided sampling before the area resize keeps this well under a millisecond
+        step = max(1, min(frame.shape[0] // self.size[1], frame.shape[1] // self.size[0]) // 2)
+        small = cv2.resize(frame[::step, ::step], self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def check(self, frame, now):
+        """Return True if this frame should be inferred"""
+        thumbnail = self._thumbnail(frame)
+        if self.reference is None:
+            moving = True
+        else:
+            changed = cv2.absdiff(thumbnail, self.reference) > self.pixel_threshold
+            moving = np.count_nonzero(changed) > self.min_changed * changed.size
+        if moving:
+            self.last_motion = now
+            self.state = "active"
+        elif now - self.last_motion >= self.idle_after:
+            self.state = "idle"
+
+        if self.state == "idle" and now - self.last_pass < self.keepalive_interval:
+            self.gated += 1
+            return False
+        # Compare later frames with the one the model actually saw, so slow
+        # movement still adds up to motion
+        self.reference = thumbnail
+        self.last_pass = now
+        self.passed += 1
+        return True
+
+    def stats(self):
+        return {"state": self.state, "passed": self.passed, "gated": self.gated}
@@ -0,0 +1,214 @@
+import cv2
+import numpy as np
+
+from landmarks import POSE_CONNECTIONS
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+GOOD_COLOR = (0, 255, 0)
+BAD_COLOR = (0, 0, 255)
+TEXT_COLOR = (255, 255, 255)
+SKELETON_COLOR = (224, 224, 224)
+JOINT_COLOR = (0, 0, 255)
+
+
+class Layer:
+    """A rasterised piece of overlay: a BGR patch, its coverage mask and where it goes"""
+
+    def __init__(self, x, y, image, mask):
+        self.x = x
+        self.y = y
+        self.image = image
+        self.mask = mask
+
+    @classmethod
+    def draw(cls, shape, box, paint):
+        """Rasterise with paint(canvas, offset) inside box = (x0, y0, x1, y1), clipped to shape"""
+        h, w = shape[:2]
+        x0, y0 = max(int(box[0]), 0), max(int(box[1]), 0)
+        x1, y1 = min(int(box[2]), w), min(int(box[3]), h)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        canvas = np.zeros((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        paint(canvas, (x0, y0))
+        # Every overlay colour is bright enough to stay non-zero in grey, so
+        # the grey image doubles as the coverage mask
+        mask = cv2.cvtColor(canvas, cv2.COLOR_BGR2GRAY)
+        return cls(x0, y0, canvas, mask)
+
+    def moved(self, x, y):
+        """The same layer placed at another position"""
+        return Layer(x, y, self.image, self.mask)
+
+    def composite(self, frame, opacity=1.0):
+        h, w = frame.shape[:2]
+        # Clip to the frame; moved layers may hang over its edges
+        x0, y0 = max(self.x, 0), max(self.y, 0)
+        x1 = min(self.x + self.image.shape[1], w)
+        y1 = min(self.y + self.image.shape[0], h)
+        if x1 <= x0 or y1 <= y0:
+            return
+        region = frame[y0:y1, x0:x1]
+        patch = self.image[y0 - self.y:y1 - self.y, x0 - self.x:x1 - self.x]
+        mask = self.mask[y0 - self.y:y1 - self.y, x0 - self.x:x1 - self.x]
+        if opacity < 1.0:
+            patch = cv2.addWeighted(region, 1.0 - opacity, patch, opacity, 0)
+        # Writes through the region view into the frame
+        cv2.copyTo(patch, mask, region)
+
+
+def landmark_pixels(shape, landmarks, visibility_threshold=0.5):
+    """Top-left (x, y) pixel of the visible landmarks, or None"""
+    visible = landmarks[landmarks[:, 3] >= visibility_threshold, :2]
+    if not len(visible):
+        return None
+    x, y = visible.min(axis=0) * (shape[1], shape[0])
+    return x, y
+
+
+def skeleton_layer(shape, landmarks, connections=POSE_CONNECTIONS, visibility_threshold=0.5):
+    """Layer with the skeleton of a (33, 4) normalised landmark array"""
+    h, w = shape[:2]
+    points = (landmarks[:, :2] * (w, h)).astype(np.int32)
+    visible = landmarks[:, 3] >= visibility_threshold
+    if not visible.any():
+        return None
+    shown = points[visible]
+    # Lines are 2 px wide and joints have radius 3, so pad the box a little
+    x0, y0 = shown.min(axis=0) - 4
+    x1, y1 = shown.max(axis=0) + 5
+
+    def paint(canvas, offset):
+        local = (points - offset).tolist()
+        flags = visible.tolist()
+        for start, end in connections:
+            if flags[start] and flags[end]:
+                cv2.line(canvas, tuple(local[start]), tuple(local[end]), SKELETON_COLOR, 2)
+        for point, is_visible in zip(local, flags):
+            if is_visible:
+                cv2.circle(canvas, tuple(point), 2, JOINT_COLOR, 2)
+
+    return Layer.draw(shape, (x0, y0, x1, y1), paint)
+
+
+def text_layer(shape, lines):
+    """Layer with lines of (text, origin, scale, color, thickness)"""
+    boxes = []
+    for text, (x, y), scale, _, thickness in lines:
+        (width, height), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+        boxes.append((x - thickness, y - height - thickness, x + width + thickness, y + baseline + thickness))
+    if not boxes:
+        return None
+    boxes = np.array(boxes)
+    box = (*boxes[:, :2].min(axis=0), *boxes[:, 2:].max(axis=0))
+
+    def paint(canvas, offset):
+        for text, (x, y), scale, color, thickness in lines:
+            cv2.putText(canvas, text, (x - offset[0], y - offset[1]), FONT, scale, color, thickness)
+
+    return Layer.draw(shape, box, paint)
+
+
+class OverlayRenderer:
+    """Draws the skeleton and feedback text as cached layers over raw frames.
+
+    The text layer only changes with the published status and the skeleton
+    layer only with the landmarks, so frames that show the same inference
+    result (predicted, gated or cached frames, or several frames between
+    two status updates) just composite the existing layers instead of
+    drawing again. Compositing touches only the pixels the layers cover.
+    In multi-person mode every person gets a cached skeleton and label.
+    """
+
+    def __init__(self, connections=POSE_CONNECTIONS, opacity=1.0):
+        self.connections = connections
+        self.opacity = opacity
+        self._skeletons = {}  # person id (None for single-person) -> (landmarks, shape, layer)
+        self._labels = {}  # person id -> (text, color, layer)
+        self._text_key = None
+        self._text = None
+        self.drawn = 0
+        self.reused = 0
+
+    def reset(self):
+        self._skeletons = {}
+        self._labels = {}
+        self._text_key = self._text = None
+
+    def skeleton(self, shape, landmarks, person=None):
+        """The skeleton layer for landmarks, redrawn only when they changed"""
+        # Comparing 33 landmarks is far cheaper than drawing them
+        cached = self._skeletons.get(person)
+        if cached is not None and cached[1] == shape and np.array_equal(cached[0], landmarks):
+            self.reused += 1
+            return cached[2]
+        layer = skeleton_layer(shape, landmarks, self.connections)
+        self._skeletons[person] = (landmarks.copy(), shape, layer)
+        self.drawn += 1
+        return layer
+
+    def text(self, shape, snapshot, alarm=False):
+        """The angle/feedback (and alarm) text layer for a status snapshot"""
+        text_key = (shape, snapshot.angle, snapshot.feedback, snapshot.form_status, alarm)
+        if text_key == self._text_key:
+            self.reused += 1
+            return self._text
+        feedback_color = GOOD_COLOR if snapshot.form_status == "good" else BAD_COLOR
+        lines = [
+            # Always show angle text
+            (snapshot.angle, (10, 60), 0.7, TEXT_COLOR, 2),
+            # Show stable feedback text (doesn't flicker)
+            (snapshot.feedback, (10, 90), 0.7, feedback_color, 2),
+        ]
+        if alarm:
+            lines.append(("ALARM: Fix Your Form!", (50, 120), 1, BAD_COLOR, 3))
+        self._text = text_layer(shape, [line for line in lines if line[0]])
+        self._text_key = text_key
+        self.drawn += 1
+        return self._text
+
+    def label(self, shape, person, text, color, x, y):
+        """A person's label, drawn once and moved along with them"""
+        cached = self._labels.get(person)
+        if cached is not None and cached[:2] == (text, color):
+            self.reused += 1
+            layer = cached[2]
+        else:
+            layer = text_layer((10000, 10000), [(text, (2, 20), 0.6, color, 2)])
+            self._labels[person] = (text, color, layer)
+            self.drawn += 1
+        if layer is None:
+            return None
+        return layer.moved(int(x), int(y) - layer.image.shape[0])
+
+    def render(self, frame, landmarks, snapshot, alarm=False, people=None):
+        """Composite the overlay for landmarks and status onto frame in place.
+
+        people, in multi-person mode, lists (id, landmarks, form_status,
+        label) for everyone in view; snapshot then describes the person
+        the text refers to.
+        """
+        shape = frame.shape
+        layers = []
+        if people:
+            for person, person_landmarks, form_status, text in people:
+                layers.append(self.skeleton(shape, person_landmarks, person))
+                box = landmark_pixels(shape, person_landmarks)
+                if box is not None:
+                    color = GOOD_COLOR if form_status == "good" else BAD_COLOR if form_status == "bad" else TEXT_COLOR
+                    layers.append(self.label(shape, person, text, color, box[0], box[1]))
+            # Forget people who left
+            shown = {person[0] for person in people}
+            self._skeletons = {k: v for k, v in self._skeletons.items() if k in shown}
+            self._labels = {k: v for k, v in self._labels.items() if k in shown}
+        elif landmarks is not None:
+            layers.append(self.skeleton(shape, landmarks))
+        else:
+            return frame
+        layers.append(self.text(shape, snapshot, alarm))
+        for layer in layers:
+            if layer is not None:
+                layer.composite(frame, self.opacity)
+        return frame
+
+    def stats(self):
+        return {"layers_drawn": self.drawn, "layers_reused": self.reused}
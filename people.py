@@ -0,0 +1,248 @@
+import cv2
+import numpy as np
+
+from landmarks import landmarks_to_array
+from roi import RoiTracker
+
+
+def box_iou(a, b):
+    """IoU matrix between (n, 4) and (m, 4) arrays of (x0, y0, x1, y1) boxes"""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    x0 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y0 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x1 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y1 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def landmark_box(landmarks, w, h, min_visibility=0.5, min_landmarks=4):
+    """Pixel bounding box of the visible landmarks, or None"""
+    visible = landmarks[landmarks[:, 3] >= min_visibility, :2]
+    if len(visible) < min_landmarks:
+        return None
+    (x0, y0), (x1, y1) = visible.min(axis=0) * (w, h), visible.max(axis=0) * (w, h)
+    return (float(x0), float(y0), float(x1), float(y1))
+
+
+class PersonDetector:
+    """Finds people with OpenCV's HOG pedestrian detector.
+
+    Detection runs on a copy scaled to `detect_width`, so its cost does not
+    grow with the camera resolution.
+    """
+
+    def __init__(self, detect_width=400, min_confidence=0.3, nms_threshold=0.4):
+        self.detect_width = detect_width
+        self.min_confidence = min_confidence
+        self.nms_threshold = nms_threshold
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def detect(self, frame):
+        """(n, 4) array of full-frame pixel boxes"""
+        scale = min(1.0, self.detect_width / frame.shape[1])
+        small = frame
+        if scale < 1.0:
+            small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        rects, weights = self.hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects) == 0:
+            return np.zeros((0, 4))
+        weights = np.ravel(weights)
+        keep = cv2.dnn.NMSBoxes(rects.tolist(), weights.tolist(), self.min_confidence, self.nms_threshold)
+        keep = np.ravel(keep).astype(int)
+        boxes = rects[keep].astype(np.float64)
+        boxes[:, 2:] += boxes[:, :2]
+        return boxes / scale
+
+
+class PersonTrack:
+    """One person followed across frames, with a pose model of its own"""
+
+    def __init__(self, track_id, box, pose, inference_size=256):
+        self.id = track_id
+        self.box = box  # Latest (x0, y0, x1, y1) in full-frame pixels
+        self.pose = pose  # MediaPipe keeps per-person tracking state in here
+        self.roi = RoiTracker(inference_size=inference_size)
+        self.landmarks = None  # Full-frame normalised (33, 4), from the last inference that found them
+        self.missed = 0  # Consecutive inferences without landmarks
+        self.hits = 0
+
+    @property
+    def area(self):
+        return (self.box[2] - self.box[0]) * (self.box[3] - self.box[1])
+
+
+class MultiPersonTracker:
+    """Follows several people and infers each one's landmarks on a crop.
+
+    People are detected every `detect_interval` seconds, or every
+    `search_interval` seconds while nobody is tracked. Detections are
+    matched to existing tracks by IoU, falling back to whether the
+    detection's centre lies inside a track.
+    Unmatched detections start new tracks. Between detections every track
+    crops around its own landmarks (a RoiTracker each) and runs its own
+    pose model. The crops are inferred concurrently, so the cost follows
+    the number of people rather than the frame size. A track ends after
+    `max_missed` inferences without landmarks, or when it has locked onto
+    the same person as an older track.
+    """
+
+    def __init__(
+        self,
+        pose_pool,
+        max_people=4,
+        detect_interval=1.0,
+        search_interval=0.25,
+        iou_threshold=0.3,
+        max_missed=5,
+        inference_size=256,
+        detector=None,
+    ):
+        self.pose_pool = pose_pool  # Source of the per-track models
+        self.max_people = max_people
+        self.detect_interval = detect_interval
+        self.search_interval = search_interval
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.inference_size = inference_size
+        self.detector = detector or PersonDetector()
+        self.tracks = []
+        self.next_id = 1
+        self.last_detection = None
+        self._executor = None
+        self.detections = 0
+        self.created = 0
+        self.dropped = 0
+
+    def reset(self):
+        """Forget every track and return their models to the pool"""
+        for track in self.tracks:
+            self.pose_pool.release(track.pose)
+        self.tracks = []
+        self.last_detection = None
+
+    def close(self):
+        self.reset()
+        if self._executor is not None:
+            # Called once inference has stopped, so nothing is left running
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def update(self, frame, timestamp):
+        """Detect, associate and infer everyone in a frame; returns the live tracks"""
+        h, w = frame.shape[:2]
+        interval = self.detect_interval if self.tracks else self.search_interval
+        if self.last_detection is None or timestamp - self.last_detection >= interval:
+            self.last_detection = timestamp
+            self.detections += 1
+            self._associate(self.detector.detect(frame), w, h)
+
+        if len(self.tracks) > 1:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._executor = ThreadPoolExecutor(max_workers=self.max_people, thread_name_prefix="person")
+            # MediaPipe releases the GIL while its graph runs, so the
+            # people are inferred in parallel
+            results = list(self._executor.map(lambda track: self._infer(track, frame), self.tracks))
+        else:
+            results = [self._infer(track, frame) for track in self.tracks]
+
+        for track, landmarks in zip(self.tracks, results):
+            if landmarks is None:
+                track.missed += 1
+                continue
+            track.missed = 0
+            track.hits += 1
+            track.landmarks = landmarks
+            track.box = landmark_box(landmarks, w, h) or track.box
+
+        self._drop([track for track in self.tracks if track.missed > self.max_missed])
+        self._drop(self._duplicates())
+        return list(self.tracks)
+
+    def _infer(self, track, frame):
+        h, w = frame.shape[:2]
+        if track.roi.box is None:
+            track.roi.focus(*track.box, w, h)
+        image, transform = track.roi.prepare(frame)
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        image_rgb.flags.writeable = False
+        results = track.pose.process(image_rgb)
+        if not results.pose_landmarks:
+            # Widen back to the last known box next time
+            track.roi.reset()
+            return None
+        landmarks = track.roi.map_back(landmarks_to_array(results.pose_landmarks), transform)
+        track.roi.update(landmarks, w, h)
+        return landmarks
+
+    def _associate(self, boxes, w, h):
+        unmatched = list(range(len(boxes)))
+        if self.tracks and len(boxes):
+            iou = box_iou([track.box for track in self.tracks], boxes)
+            # Greedy matching, best overlap first
+            while iou.size and iou.max() >= self.iou_threshold:
+                t, d = np.unravel_index(iou.argmax(), iou.shape)
+                self._refresh(self.tracks[t], boxes[d], w, h)
+                unmatched.remove(d)
+                iou[t, :] = -1
+                iou[:, d] = -1
+            # Detections centred inside a track belong to it too
+            for d in list(unmatched):
+                cx, cy = (boxes[d][0] + boxes[d][2]) / 2, (boxes[d][1] + boxes[d][3]) / 2
+                for track in self.tracks:
+                    x0, y0, x1, y1 = track.box
+                    if x0 <= cx <= x1 and y0 <= cy <= y1:
+                        unmatched.remove(d)
+                        break
+
+        for d in unmatched:
+            if len(self.tracks) >= self.max_people:
+                break
+            pose = self.pose_pool.acquire(timeout=0)
+            if pose is None:
+                break
+            track = PersonTrack(self.next_id, tuple(boxes[d]), pose, self.inference_size)
+            track.roi.focus(*track.box, w, h)
+            self.next_id += 1
+            self.created += 1
+            self.tracks.append(track)
+
+    def _refresh(self, track, box, w, h):
+        # A track that has lost its person re-centres on the detection
+        if track.missed or track.landmarks is None:
+            track.box = tuple(box)
+            track.roi.focus(*track.box, w, h)
+
+    def _duplicates(self):
+        """Younger tracks whose person is already followed by an older one"""
+        live = [track for track in self.tracks if track.missed == 0]
+        if len(live) < 2:
+            return []
+        iou = box_iou([track.box for track in live], [track.box for track in live])
+        duplicates = []
+        for i in range(len(live)):
+            for j in range(i + 1, len(live)):
+                if iou[i, j] > 0.7:
+                    duplicates.append(live[j] if live[j].id > live[i].id else live[i])
+        return duplicates
+
+    def _drop(self, tracks):
+        for track in tracks:
+            if track in self.tracks:
+                self.tracks.remove(track)
+                self.pose_pool.release(track.pose)
+                self.dropped += 1
+
+    def stats(self):
+        return {
+            "people": len(self.tracks),
+            "detections": self.detections,
+            "tracks_created": self.created,
+            "tracks_dropped": self.dropped,
+        }
@@ -0,0 +1,152 @@
+import collections
+import threading
+import time
+
+
+class FramePacket:
+    """A frame travelling through the detection pipeline together with
+    everything the stages learn about it."""
+
+    __slots__ = (
+        "seq",
+        "timestamp",
+        "media_time",
+        "frame",
+        "results",
+        "landmarks",
+        "angles",
+        "alarm",
+        "predicted",
+        "people",
+    )
+
+    def __init__(self, seq, timestamp, frame, media_time=None):
+        self.seq = seq
+        self.timestamp = timestamp  # time.perf_counter() at capture
+        # Seconds on the source's own clock: position / fps for recordings,
+        # the capture time for live sources. Smoothing, reps and recordings
+        # follow this clock.
+        self.media_time = timestamp if media_time is None else media_time
+        self.frame = frame
+        self.results = None
+        self.landmarks = None
+        self.angles = None  # Joint angles ordered like landmarks.ANGLE_NAMES
+        self.alarm = False
+        self.predicted = False  # Landmarks estimated rather than inferred
+        self.people = None  # Multi-person mode: (id, landmarks, form_status, label) per person
+
+
+# Snapshot fields shown to users; a change to any of them wakes status
+# subscribers, while landmarks and angles change with every frame
+STATUS_FIELDS = (
+    "running",
+    "feedback",
+    "angle",
+    "form_status",
+    "exercise_type",
+    "alarm_count",
+    "recording",
+    "motion",
+    "people",
+    "reps",
+    "phase",
+    "last_rep_time",
+    "avg_rep_time",
+)
+
+
+class StatusSnapshot(collections.namedtuple(
+    "StatusSnapshot",
+    ("version", "status_version", "seq", "timestamp", "landmarks", "angles") + STATUS_FIELDS,
+)):
+    """Immutable state of a detector after one processed frame.
+
+    The detector swaps in a new snapshot rather than changing fields one at
+    a time, so a reader that takes detector.snapshot once sees a consistent
+    state without locking. `version` goes up with every snapshot and
+    `status_version` only when one of STATUS_FIELDS changes. Landmark and
+    angle arrays are read-only.
+    """
+
+    __slots__ = ()
+
+    def status(self):
+        """The user-facing fields as a dict, versioned by status_version"""
+        status = {"version": self.status_version}
+        for field in STATUS_FIELDS:
+            status[field] = getattr(self, field)
+        return status
+
+
+class DropOldestQueue:
+    """Bounded queue between two pipeline stages.
+
+    In dropping mode a put() on a full queue discards the oldest item so the
+    consumer always sees the newest frames; live cameras use this so a slow
+    stage never backs up the one in front of it. With drop=False put()
+    blocks instead, which is what offline sources want since every frame
+    must be processed.
+    """
+
+    def __init__(self, name, maxsize=1, drop=True):
+        self.name = name
+        self.maxsize = maxsize
+        self.drop = drop
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item):
+        """Add an item; returns False if the queue has been closed"""
+        with self._cond:
+            while not self.drop and len(self._items) >= self.maxsize and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Return the next item, or None on timeout or once closed and drained"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._items:
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """Wake up every waiter; pending items can still be drained"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def depth(self):
+        with self._cond:
+            return len(self._items)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "depth": len(self._items),
+                "maxsize": self.maxsize,
+                "put": self.put_count,
+                "dropped": self.dropped,
+            }
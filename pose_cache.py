@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+
+
+def frame_hash(frame, hash_size=16):
+    """Perceptual key for a BGR frame: a hash_size x hash_size grey thumbnail.
+
+    Each cell averages a block of the frame, so sensor noise and compression
+    artefacts move it by a level or two while a limb moving through the
+    block changes it a lot.
+    """
+    # Sample every step-th pixel first; averaging a few samples per cell is
+    # enough and area-resizing the full frame is far slower
+    step = max(1, min(frame.shape[:2]) // (hash_size * 4))
+    small = cv2.resize(frame[::step, ::step], (hash_size, hash_size), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small.ravel().astype(np.int16)
+
+
+class PoseCache:
+    """LRU cache of pose results keyed by a perceptual hash of the frame.
+
+    A lookup hits when at most `threshold` thumbnail cells of a cached frame
+    differ from the new one by more than `tolerance` grey levels; the whole
+    cache is compared in one vectorised step. Results for frames without a
+    person are cached too.
+    """
+
+    def __init__(self, max_size=256, threshold=0, tolerance=8, hash_size=16):
+        self.max_size = max_size
+        self.threshold = threshold  # Changed cells still counted as the same frame
+        self.tolerance = tolerance  # Grey levels a cell may drift from noise alone
+        self.hash_size = hash_size
+        self.hashes = np.zeros((max_size, hash_size * hash_size), dtype=np.int16)
+        self.last_used = np.zeros(max_size, dtype=np.int64)
+        self.values = [None] * max_size
+        self.size = 0
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        self.values = [None] * self.max_size
+        self.size = 0
+
+    def lookup(self, frame):
+        """Return (key, hit, landmarks); pass key to store() after a miss"""
+        key = frame_hash(frame, self.hash_size)
+        self.clock += 1
+        if self.size:
+            changed = (np.abs(self.hashes[:self.size] - key) > self.tolerance).sum(axis=1)
+            best = int(changed.argmin())
+            if changed[best] <= self.threshold:
+                self.last_used[best] = self.clock
+                self.hits += 1
+                return key, True, self.values[best]
+        self.misses += 1
+        return key, False, None
+
+    def store(self, key, landmarks):
+        if self.size < self.max_size:
+            slot = self.size
+            self.size += 1
+        else:
+            slot = int(self.last_used.argmin())
+            self.evictions += 1
+        self.hashes[slot] = key
+        self.last_used[slot] = self.clock
+        self.values[slot] = landmarks
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import numpy as np
+
+
+class PosePool:
+    """Pool of MediaPipe Pose instances shared by detection sessions.
+
+    Building a Pose graph is expensive, so finished sessions hand their
+    instance back instead of closing it. At most `max_size` instances exist
+    at once; acquire() blocks until one is free when the pool is exhausted.
+    """
+
+    def __init__(self, max_size=None, **pose_kwargs):
+        self.max_size = max_size
+        self.pose_kwargs = pose_kwargs or {
+            "min_detection_confidence": 0.5,
+            "min_tracking_confidence": 0.5,
+        }
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self.prewarm_seconds = None
+
+    def _create(self):
+        import mediapipe as mp
+
+        return mp.solutions.pose.Pose(**self.pose_kwargs)
+
+    def acquire(self, timeout=None):
+        """Return a ready Pose instance, or None if none freed up in time"""
+        with self._cond:
+            while not self._idle:
+                if self.max_size is None or self._created < self.max_size:
+                    self._created += 1
+                    break
+                if not self._cond.wait(timeout):
+                    return None
+            else:
+                return self._idle.pop()
+        try:
+            return self._create()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def prewarm(self, count=1):
+        """Build instances ahead of time so the next sessions start warm.
+
+        Each new instance runs once on a blank image, which loads the model
+        and its graph; afterwards `count` instances (within max_size) are
+        idle. Returns the seconds this took.
+        """
+        started = time.perf_counter()
+        with self._cond:
+            needed = count - len(self._idle)
+            if self.max_size is not None:
+                needed = min(needed, self.max_size - self._created)
+            needed = max(needed, 0)
+            self._created += needed
+        for _ in range(needed):
+            try:
+                pose = self._create()
+                pose.process(np.zeros((64, 64, 3), dtype=np.uint8))
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+            self.release(pose)
+        self.prewarm_seconds = time.perf_counter() - started
+        return self.prewarm_seconds
+
+    def release(self, pose):
+        """Give an instance back for the next session"""
+        # Forget the previous person's tracking state where supported
+        if hasattr(pose, "reset"):
+            pose.reset()
+        with self._cond:
+            self._idle.append(pose)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for pose in idle:
+            pose.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "created": self._created,
+                "idle": len(self._idle),
+                "max_size": self.max_size,
+                "prewarm_ms": round(self.prewarm_seconds * 1000, 1) if self.prewarm_seconds is not None else None,
+            }
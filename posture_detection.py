@@ -1,477 +1,822 @@
 import cv2
-import mediapipe as mp
-import math
 import threading
-from playsound import playsound
-import tkinter as tk
-from tkinter import ttk
-from PIL import Image, ImageTk
 import numpy as np
+from frame_buffer import FrameRingBuffer
+from events import AudioSink, EventBus
+from frame_sources import open_source
+from landmarks import angles_between, compute_angles, joint_visibility, landmarks_to_array
+from metrics import PipelineMetrics
+from motion import MotionGate
+from overlay import OverlayRenderer
+from pipeline import STATUS_FIELDS, DropOldestQueue, FramePacket, StatusSnapshot
+from pose_cache import PoseCache
+from people import MultiPersonTracker
+from pose_pool import PosePool
+from recording import SessionRecorder
+from reps import NO_REPS, RepCounter
+from roi import RoiTracker
+from rules import RuleEvaluator, load_exercises
+from scheduling import InferenceScheduler, LandmarkPredictor
+from smoothing import LandmarkFilter
 
-# Constants for exercise angles
-HAND_RAISE_MIN_ANGLE = 150  # Minimum angle for hand raise
-HAND_CURL_MAX_ANGLE = 120  # Maximum angle for hand curl
+# Consecutive bad frames before reporting bad form. Smoothed landmarks
+# don't flicker, so they need far less debounce than raw ones.
+SMOOTHED_BAD_FRAMES = 2
+RAW_BAD_FRAMES = 5
+
+
+class FormMonitor:
+    """Turns per-frame form checks into a stable good/bad status and decides
+    when the alarm should go off."""
+
+    def __init__(self, bad_frames=5, alarm_frames=15):
+        self.bad_frames = bad_frames  # Consecutive bad frames before reporting bad form
+        self.alarm_frames = alarm_frames  # Further bad frames before the alarm fires
+        self.reset()
+
+    def reset(self):
+        self.consecutive_wrong_frames = 0
+        self.wrong_form_counter = 0
+        self.alarm_triggered = False
+        self.form_status = ""
+
+    def update(self, is_incorrect):
+        """Feed one frame's check; returns (status_changed, alarm_fired)"""
+        status_changed = False
+        alarm_fired = False
+
+        # Count consecutive frames with wrong form
+        if is_incorrect:
+            self.consecutive_wrong_frames += 1
+            if self.consecutive_wrong_frames >= self.bad_frames:
+                self.wrong_form_counter += 1
+                # Set form status to bad only when stable
+                if self.form_status != "bad":
+                    self.form_status = "bad"
+                    status_changed = True
+        else:
+            # Reset wrong form counter on good form
+            self.consecutive_wrong_frames = 0
+            self.wrong_form_counter = 0
+            if self.form_status != "good":
+                self.form_status = "good"
+                status_changed = True
+
+        # Trigger alarm after threshold (only once per sequence)
+        if self.wrong_form_counter >= self.alarm_frames and not self.alarm_triggered:
+            self.alarm_triggered = True
+            alarm_fired = True
+            # Reset wrong form counter after alarm
+            self.wrong_form_counter = 0
+
+        # If form is good for a while, reset alarm trigger
+        if self.form_status == "good" and self.consecutive_wrong_frames == 0:
+            self.alarm_triggered = False
+
+        return status_changed, alarm_fired
+
+
+def score_frame(rules, form_monitor, rep_counter, landmarks, angles, timestamp, feedback=""):
+    """Check one frame's joint angles against an exercise.
+
+    Runs the rules, the form monitor and the rep counter and returns
+    (changes, form_changed, alarm, rep_completed); changes holds the status
+    fields to publish. `feedback` is kept while the form is unsettled.
+    """
+    exercise = rules.exercise
+    violated = rules.evaluate(angles, joint_visibility(landmarks))
+    form_changed, alarm = form_monitor.update(violated.any())
+    rep_status = NO_REPS
+    rep_completed = False
+    if rep_counter is not None:
+        rep_completed = rep_counter.update(float(angles[rep_counter.angle_index]), timestamp)
+        rep_status = rep_counter.status()
+
+    form_status = form_monitor.form_status
+    if form_status == "good":
+        feedback = exercise.good_message
+    elif form_status == "bad" and violated.any():
+        # Follow whichever rule is currently broken
+        feedback = exercise.message(violated)
+
+    changes = dict(
+        angle=exercise.angle_text(angles),
+        feedback=feedback,
+        form_status=form_status,
+        exercise_type=exercise.name,
+        **rep_status,
+    )
+    return changes, form_changed, alarm, rep_completed
+
+
+class PersonState:
+    """Smoothing, form and rep state of one tracked person in multi-person mode"""
+
+    def __init__(self, person_id, exercise, smoothing=True):
+        self.id = person_id
+        self.exercise = exercise  # None when the selected exercise is unknown
+        self.smoother = LandmarkFilter() if smoothing else None
+        self.form_monitor = FormMonitor(bad_frames=SMOOTHED_BAD_FRAMES if smoothing else RAW_BAD_FRAMES)
+        self.rules = RuleEvaluator(exercise) if exercise is not None else None
+        self.rep_counter = RepCounter.from_exercise(exercise) if exercise is not None else None
+        self.landmarks = None
+        self.angles = None
+        self.alarm_count = 0
+        self.changes = dict(
+            angle="", feedback="", form_status="",
+            exercise_type=exercise.name if exercise is not None else "", **NO_REPS,
+        )
+
+    def update(self, timestamp, landmarks, w, h):
+        """Score this person's newest landmarks; returns (form_changed, alarm, rep_completed)"""
+        if self.smoother is not None:
+            landmarks = self.smoother.update(timestamp, landmarks)
+        angles = compute_angles(landmarks, w, h)
+        landmarks.flags.writeable = False
+        angles.flags.writeable = False
+        self.landmarks, self.angles = landmarks, angles
+        if self.rules is None:
+            return False, False, False
+        self.changes, form_changed, alarm, rep_completed = score_frame(
+            self.rules, self.form_monitor, self.rep_counter, landmarks, angles, timestamp, self.changes["feedback"]
+        )
+        self.alarm_count += alarm
+        return form_changed, alarm, rep_completed
+
+    def label(self):
+        return f"#{self.id}  {self.changes['reps']} reps"
+
+    def status(self, box):
+        return dict(self.changes, id=self.id, box=[int(v) for v in box], alarm_count=self.alarm_count)
 
 
 class ExerciseDetector:
-    def __init__(self):
+    def __init__(
+        self,
+        source=None,
+        target_fps=30.0,
+        cpu_budget=0.8,
+        adaptive_inference=None,
+        frame_buffer=None,
+        pose_pool=None,
+        roi_tracking=False,
+        inference_size=256,
+        exercises_path=None,
+        smoothing=True,
+        recording_dir=None,
+        cache_poses=False,
+        motion_gating=None,
+        render_overlay=True,
+        events=None,
+        multi_person=False,
+        max_people=4,
+    ):
         self.running = False
         self.exercise_type = "hand_raise"
-        self.cap = None
+        # Exercise definitions (rules, feedback, phases) are data; see rules.py
+        self.exercises = load_exercises(exercises_path)
+        self._rules = None
+        # Rep count, movement phase and tempo for the selected exercise
+        self.rep_counter = None
+        # Where frames come from: a FrameSource, camera index, video file,
+        # image directory or iterable of frames. Defaults to the webcam.
+        self.source = open_source(source)
         self.detection_thread = None
-        self.current_frame = None
-        self.feedback_text = ""
-        self.angle_text = ""
-        self.form_status = ""
-        self.lock = threading.Lock()  # Add a lock for thread safety with web app
-        self.camera_index = 0  # Default camera index
+        # Published frames live in a preallocated ring; pass a shared-memory
+        # backed FrameRingBuffer to serve them to another process
+        self.frame_buffer = frame_buffer
+        # Models come from a PosePool so they are built once and can be
+        # prewarmed; without a shared pool the detector keeps its own model
+        # (one per person in multi-person mode) between runs
+        if pose_pool is None:
+            pose_pool = PosePool(max_size=max_people if multi_person else 1)
+        self.pose_pool = pose_pool
+        self.start_requested = None  # perf_counter() of the last start(), for first-frame latency
+        # Everything readers need is published as one immutable snapshot
+        # per processed frame; the lock only serialises writers
+        self.lock = threading.Lock()
+        self.snapshot = StatusSnapshot(
+            version=0,
+            status_version=0,
+            seq=0,
+            timestamp=None,
+            landmarks=None,
+            angles=None,
+            running=False,
+            feedback="",
+            angle="",
+            form_status="",
+            exercise_type=self.exercise_type,
+            alarm_count=0,
+            recording=None,
+            motion=None,
+            people=None,
+            **NO_REPS,
+        )
+        # Status subscribers (e.g. the /events stream) wait on this instead
+        # of polling; it fires when snapshot.status_version goes up
+        self.status_changed = threading.Condition(self.lock)
+        self.camera_index = None  # Set once a webcam source has been opened
+        # Landmarks are smoothed over time before angles are taken from them
+        self.smoother = LandmarkFilter() if smoothing else None
+        self.form_monitor = FormMonitor(bad_frames=SMOOTHED_BAD_FRAMES if smoothing else RAW_BAD_FRAMES)
+        # Inference rate follows measured model latency. By default this is
+        # only done for live sources; offline sources infer every frame.
+        self.adaptive_inference = adaptive_inference
+        self.scheduler = InferenceScheduler(target_fps=target_fps, cpu_budget=cpu_budget)
+        # The motion gate drops inference to a keep-alive rate while the
+        # scene is still; like adaptive inference it defaults to live sources
+        self.motion_gating = motion_gating
+        self.motion_gate = MotionGate()
+        self.gate_active = False
+        self.predictor = LandmarkPredictor()
+        # With ROI tracking the model only sees a downscaled crop around
+        # the person found in the previous frame
+        self.roi = RoiTracker(inference_size=inference_size) if roi_tracking else None
+        # Optionally skip the model for frames that look like a recent one
+        self.pose_cache = PoseCache() if cache_poses else None
+        # Per-stage latency histograms and counters, served on /metrics
+        self.metrics = PipelineMetrics()
+        self.capture_queue = None
+        self.render_queue = None
+        # With a recording directory every run appends its landmarks, angles
+        # and form state to a .poselog file there (see recording.py)
+        self.recording_dir = recording_dir
+        self.recorder = None
+        # Skeleton and feedback are drawn over published frames by a cached
+        # overlay; without it (headless use) frames are published bare
+        self.overlay = OverlayRenderer() if render_overlay else None
+        # Alarms, form changes and completed reps go out through an event
+        # bus so sinks (sound, webhooks, logs) never run on the pipeline
+        self.events = events if events is not None else EventBus([AudioSink()])
+        # Multi-person mode follows up to max_people people, each with its
+        # own crop, pose model and form/rep state (see people.py). Its models
+        # come from the detector's pool, so the pool's limit and prewarmed
+        # models apply to every person
+        self.people = MultiPersonTracker(self.pose_pool, max_people=max_people) if multi_person else None
+        self.person_states = {}
+        self.last_people = []
+        # Optional callable telling whether anyone is watching the video;
+        # while it returns False frames are neither drawn nor published
+        self.video_demand = None
 
     def calculate_angle(self, a, b, c):
         """Calculates angle at point b"""
-        ba = (a[0] - b[0], a[1] - b[1])
-        bc = (c[0] - b[0], c[1] - b[1])
-
-        dot_product = ba[0] * bc[0] + ba[1] * bc[1]
-        magnitude_ba = math.sqrt(ba[0] ** 2 + ba[1] ** 2)
-        magnitude_bc = math.sqrt(bc[0] ** 2 + bc[1] ** 2)
-
-        if magnitude_ba * magnitude_bc == 0:
-            return 0
-
-        angle_rad = math.acos(dot_product / (magnitude_ba * magnitude_bc))
-        return math.degrees(angle_rad)
-
-    def is_exercise_incorrect(self, shoulder_angle, elbow_angle, exercise_type):
-        """Check if exercise form is incorrect"""
-        if exercise_type == "hand_raise":
-            return (
-                shoulder_angle < HAND_RAISE_MIN_ANGLE
-            )  # Only detect if arm not raised enough
-        elif exercise_type == "hand_curl":
-            return (
-                elbow_angle > HAND_CURL_MAX_ANGLE
-            )  # Only detect if arm extended too much
-        return False
-
-    def play_alarm_sound(self):
-        import os
-        import threading
-        try:
-            # First, try to find alarm.wav in the current directory
-            file_dir = os.path.dirname(os.path.realpath(__file__))
-            alarm_path = os.path.join(file_dir, "alarm.wav")
-            
-            # If alarm.wav doesn't exist, use a default sound
-            if not os.path.exists(alarm_path):
-                print(f"Warning: alarm.wav not found at {alarm_path}. Using alternative method.")
-                import winsound
-                # Play Windows default sound (asterisk)
-                winsound.PlaySound("SystemAsterisk", winsound.SND_ALIAS)
-            else:
-                # Use playsound as originally intended
-                print(f"Playing sound from: {alarm_path}")
-                playsound(alarm_path)
-                
-        except Exception as e:
-            print(f"Error playing sound: {e}")
-            try:
-                # Fallback to winsound on Windows
-                import winsound
-                winsound.Beep(1000, 500)  # Frequency 1000Hz, duration 500ms
-            except:
-                print("Could not play any sound!")
-
-    def get_landmark_coords(self, landmarks, landmark_point, w, h):
-        """Get coordinates for a landmark point"""
-        return (
-            int(landmarks[landmark_point].x * w),
-            int(landmarks[landmark_point].y * h),
-        )
+        a, b, c = (np.asarray(point, dtype=np.float64) for point in (a, b, c))
+        return float(angles_between(a, b, c))
+
+    def current_rules(self):
+        """RuleEvaluator for the selected exercise, or None if it is unknown.
+
+        Switching exercises also starts a fresh rep counter.
+        """
+        exercise_type = self.exercise_type
+        evaluator = self._rules
+        if evaluator is None or evaluator.exercise.name != exercise_type:
+            exercise = self.exercises.get(exercise_type)
+            if exercise is None:
+                return None
+            evaluator = self._rules = RuleEvaluator(exercise)
+            self.rep_counter = RepCounter.from_exercise(exercise)
+        return evaluator
 
     def detection_loop(self):
         import time  # Ensure time is imported
-        print("Detection loop started. Attempting to open camera...")
-        indices_to_try = [0, 1, 2]
-        camera_opened = False
-
-        for camera_index in indices_to_try:
-            print(f"Trying camera index {camera_index}...")
-            self.cap = cv2.VideoCapture(camera_index)
-            time.sleep(1)  # wait for the camera to initialize
-            if self.cap.isOpened():
-                self.camera_index = camera_index
-                camera_opened = True
-                print(f"Successfully opened camera with index {camera_index}")
-                break
-            else:
-                print(f"Failed to open camera with index {camera_index}")
-
-        if not camera_opened:
-            print("Error: Could not open any camera, retrying...")
-            time.sleep(5)
-            self.cap = cv2.VideoCapture(0)
+        print(f"Detection loop started. Opening frame source {self.source.describe()}...")
+        if not self.source.open():
+            if not self.source.live:
+                print("Failed to open frame source; aborting detection loop")
+                self.running = False
+                self._publish(running=False)
+                return
+            # Cameras that were just released by a previous session can take
+            # a moment to become available again
+            print("Error: Could not open frame source, retrying...")
             time.sleep(1)
-            if self.cap.isOpened():
-                camera_opened = True
-                self.camera_index = 0
-                print("Opened camera with index 0 on retry")
-            else:
-                print("Failed to open camera on retry; aborting detection loop")
+            if not self.source.open():
+                print("Failed to open frame source on retry; aborting detection loop")
                 self.running = False
+                self._publish(running=False)
+                return
+        self.camera_index = getattr(self.source, "camera_index", None)
+        print(f"Frame source opened: {self.source.describe()}")
+
+        # Multi-person mode gives every tracked person a model of their own
+        pose = None
+        if self.people is None:
+            pose = self.pose_pool.acquire(timeout=10)
+            if pose is None:
+                print("No pose model available in the pool; aborting detection loop")
+                self.source.release()
+                self.running = False
+                self._publish(running=False)
                 return
 
-        # Set camera resolution and properties for better performance
-        try:
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 800)  # Increased from 640
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 600)  # Increased from 480
-            self.cap.set(cv2.CAP_PROP_FPS, 30)  # Try to set FPS to 30
-            print(f"Camera properties set: {self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)}x{self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)} @ {self.cap.get(cv2.CAP_PROP_FPS)} fps")
-        except Exception as e:
-            print(f"Warning: Could not set camera properties: {e}")
-        
-        mp_pose = mp.solutions.pose
-        pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-        mp_draw = mp.solutions.drawing_utils
-        
         # Initialize the current_frame with a black frame to avoid None
-        with self.lock:
-            self.current_frame = np.zeros((600, 800, 3), dtype=np.uint8)  # Updated dimensions
-        
-        wrong_form_counter = 0
-        threshold_wrong_frames = 15  # Reduced from 30 for quicker response
+        self.publish_frame(np.zeros((600, 800, 3), dtype=np.uint8))  # Updated dimensions
+
+        if self.recording_dir:
+            import os
+
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.exercise_type}.poselog"
+            self.recorder = SessionRecorder(os.path.join(self.recording_dir, name), self.exercise_type)
+            print(f"Recording session to {self.recorder.path}")
+
+        # Capture, inference and annotation each run on their own thread so
+        # camera I/O never stalls the model and the model never stalls
+        # rendering. Live sources drop stale frames, offline sources block so
+        # every frame is analysed.
+        live = self.source.live
+        self.capture_queue = DropOldestQueue("capture", maxsize=1, drop=live)
+        self.render_queue = DropOldestQueue("render", maxsize=2, drop=live)
+        self.form_monitor.reset()
+        self._rules = None
+        self.predictor.reset()
+        if self.overlay is not None:
+            self.overlay.reset()
+        if self.people is not None:
+            self.people.reset()
+            self.person_states = {}
+            self.last_people = []
+        if self.smoother is not None:
+            self.smoother.reset()
+        if self.roi is not None:
+            self.roi.reset()
+        if self.pose_cache is not None:
+            self.pose_cache.clear()
+        if self.adaptive_inference is None:
+            self.scheduler.adaptive = live
+        else:
+            self.scheduler.adaptive = self.adaptive_inference
+        self.motion_gate.reset()
+        self.gate_active = live if self.motion_gating is None else self.motion_gating
+        self._publish(
+            recording=self.recorder.path if self.recorder is not None else None,
+            motion=self.motion_gate.state if self.gate_active else None,
+            people=() if self.people is not None else None,
+            **NO_REPS,
+        )
+
+        capture_thread = threading.Thread(target=self.capture_loop, name="capture", daemon=True)
+        inference_thread = threading.Thread(
+            target=self.inference_loop, args=(pose,), name="inference", daemon=True
+        )
+        capture_thread.start()
+        inference_thread.start()
+
+        print("Starting detection loop...")
+        self.annotate_loop()
+
+        # Wake up stages blocked on a queue so they can exit
+        self.running = False
+        self.capture_queue.close()
+        self.render_queue.close()
+        capture_thread.join()
+        inference_thread.join()
+        if self.people is None:
+            self.pose_pool.release(pose)
+        else:
+            # Returns every person's model and stops the crop thread pool
+            self.people.close()
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"Recorded {self.recorder.count} frames to {self.recorder.path}")
+
+        print("Detection loop stopped, releasing frame source...")
+        self.source.release()
+        self._publish(running=False)
+
+        print("Frame source released.")
+
+    def capture_loop(self):
+        """Pipeline stage 1: read and mirror frames from the source"""
+        import time
         frame_count = 0
+        seq = 0
         start_time = time.time()
-        
-        # Add state tracking to prevent flickering
-        last_form_status = None
-        form_stable_count = 0
-        form_stability_threshold = 5  # Frames to wait before changing form status
-        
-        # Add variables for stabilizing feedback
-        stable_feedback_text = ""
-        stable_form_status = ""
-        alarm_triggered = False
-        consecutive_wrong_frames = 0
-        
-        print("Starting detection loop...")
+
         while self.running:
             try:
-                # Read a frame from the camera
-                ret, frame = self.cap.read()
+                # Read a frame from the source
+                read_started = time.perf_counter()
+                ret, frame = self.source.read()
                 if not ret:
-                    print("Failed to read frame from camera")
-                    # Short delay to avoid CPU spinning if camera fails
+                    if self.source.exhausted:
+                        print("Frame source exhausted")
+                        break
+                    print("Failed to read frame from source")
+                    # Short delay to avoid CPU spinning if the camera fails
                     time.sleep(0.1)
                     continue
-                
+
+                captured = time.perf_counter()
+                self.metrics.observe("read", captured - read_started)
+                self.metrics.increment("frames_captured")
                 frame_count += 1
                 current_time = time.time()
                 elapsed_time = current_time - start_time
-                
+
                 # Log FPS every 5 seconds
                 if elapsed_time > 5:
                     fps = frame_count / elapsed_time
-                    print(f"Camera capturing at {fps:.2f} FPS")
+                    print(f"Capturing at {fps:.2f} FPS")
                     frame_count = 0
                     start_time = current_time
-                
-                # Process the frame
-                frame = cv2.flip(frame, 1)  # Horizontal flip (mirror)
-                
-                # Only do pose detection on every second frame to improve performance
-                process_this_frame = (frame_count % 2 == 0)
-                
-                if process_this_frame:
-                    # Convert to RGB for pose detection
-                    image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    image_rgb.flags.writeable = False
-                    results = pose.process(image_rgb)
-                    image_rgb.flags.writeable = True
-                    image = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
-                    
-                    if results.pose_landmarks:
-                        mp_draw.draw_landmarks(
-                            image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS
-                        )
-
-                        h, w, _ = image.shape
-                        landmarks = results.pose_landmarks.landmark
-
-                        # Get required landmarks
-                        left_wrist = self.get_landmark_coords(
-                            landmarks, mp_pose.PoseLandmark.LEFT_WRIST.value, w, h
-                        )
-                        left_elbow = self.get_landmark_coords(
-                            landmarks, mp_pose.PoseLandmark.LEFT_ELBOW.value, w, h
-                        )
-                        left_shoulder = self.get_landmark_coords(
-                            landmarks, mp_pose.PoseLandmark.LEFT_SHOULDER.value, w, h
-                        )
-                        left_hip = self.get_landmark_coords(
-                            landmarks, mp_pose.PoseLandmark.LEFT_HIP.value, w, h
-                        )
-
-                        # Calculate angles
-                        shoulder_angle = self.calculate_angle(
-                            left_elbow, left_shoulder, left_hip
-                        )
-                        elbow_angle = self.calculate_angle(
-                            left_wrist, left_elbow, left_shoulder
-                        )
-
-                        # Update angle text and feedback instantly
-                        with self.lock:
-                            if self.exercise_type == "hand_raise":
-                                self.angle_text = f"Shoulder Angle: {int(shoulder_angle)}°"
-                            else:
-                                self.angle_text = f"Elbow Angle: {int(elbow_angle)}°"
-
-                        # Determine the current form status
-                        is_incorrect = self.is_exercise_incorrect(
-                            shoulder_angle, elbow_angle, self.exercise_type
-                        )
-                        
-                        # Count consecutive frames with wrong form
-                        if is_incorrect:
-                            consecutive_wrong_frames += 1
-                            if consecutive_wrong_frames >= 5:  # Stabilize for at least 5 frames
-                                wrong_form_counter += 1
-                                # Set form status to bad only when stable
-                                if stable_form_status != "bad":
-                                    stable_form_status = "bad"
-                                    if self.exercise_type == "hand_raise":
-                                        stable_feedback_text = "Warning: Raise your arm higher"
-                                    else:
-                                        stable_feedback_text = "Warning: Curl your arm more"
-                                    
-                                    # Update the shared data
-                                    with self.lock:
-                                        self.form_status = "bad"
-                                        self.feedback_text = stable_feedback_text
-                        else:
-                            # Reset wrong form counter on good form
-                            consecutive_wrong_frames = 0
-                            wrong_form_counter = 0
-                            
-                            # Set form status to good when stable
-                            if stable_form_status != "good":
-                                stable_form_status = "good"
-                                stable_feedback_text = "Good Form!"
-                                
-                                # Update the shared data
-                                with self.lock:
-                                    self.form_status = "good"
-                                    self.feedback_text = stable_feedback_text
-                        
-                        # Trigger alarm after threshold (only once per sequence)
-                        if wrong_form_counter >= threshold_wrong_frames and not alarm_triggered:
-                            alarm_triggered = True
-                            cv2.putText(
-                                image,
-                                "ALARM: Fix Your Form!",
-                                (50, 120),
-                                cv2.FONT_HERSHEY_SIMPLEX,
-                                1,
-                                (0, 0, 255),
-                                3,
-                            )
-                            # Play sound in a separate thread with clear print indication
-                            print("TRIGGERING ALARM SOUND NOW!")
-                            alarm_thread = threading.Thread(target=self.play_alarm_sound, daemon=True)
-                            alarm_thread.start()
-                            
-                            # Reset wrong form counter after alarm
-                            wrong_form_counter = 0
-                        
-                        # If form is good for a while, reset alarm trigger
-                        if stable_form_status == "good" and consecutive_wrong_frames == 0:
-                            alarm_triggered = False
-                        
-                        # Always show angle text
-                        cv2.putText(
-                            image,
-                            self.angle_text,
-                            (10, 60),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.7,
-                            (255, 255, 255),
-                            2,
-                        )
-                        
-                        # Show stable feedback text (doesn't flicker)
-                        feedback_color = (0, 255, 0) if stable_form_status == "good" else (0, 0, 255)
-                        cv2.putText(
-                            image,
-                            stable_feedback_text,
-                            (10, 90),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.7,
-                            feedback_color,
-                            2,
-                        )
-                    else:
-                        # If no landmarks, continue displaying last feedback without change
-                        pass
-                else:
-                    image = frame
-                
-                # Always update the current frame, even if we skipped pose detection
-                with self.lock:
-                    self.current_frame = image.copy()
-                    
+
+                if self.source.mirror:
+                    frame = cv2.flip(frame, 1)  # Horizontal flip (mirror)
+                    self.metrics.since("flip", captured)
+
+                seq += 1
+                packet = FramePacket(seq, captured, frame, self.source.media_time())
+                if not self.capture_queue.put(packet):
+                    break
             except Exception as e:
-                print(f"Error in detection loop: {e}")
+                print(f"Error in capture loop: {e}")
                 time.sleep(0.1)  # Avoid tight loop on error
-        
-        print("Detection loop stopped, releasing camera...")
-        if self.cap:
-            self.cap.release()
-        
-        print("Camera released.")
+
+        self.capture_queue.close()
+
+    def inference_loop(self, pose):
+        """Pipeline stage 2: run the pose model on the newest captured frame"""
+        while True:
+            packet = self.capture_queue.get(timeout=0.5)
+            if packet is None:
+                if self.capture_queue.closed or not self.running:
+                    break
+                continue
+            try:
+                self.process_packet(pose, packet)
+                if self.recorder is not None and not packet.predicted:
+                    self.record_packet(packet)
+            except Exception as e:
+                print(f"Error in inference loop: {e}")
+            if not self.render_queue.put(packet):
+                break
+
+        self.render_queue.close()
+
+    def annotate_loop(self):
+        """Pipeline stage 3: draw the results and publish the frame"""
+        while self.running:
+            packet = self.render_queue.get(timeout=0.5)
+            if packet is None:
+                if self.render_queue.closed:
+                    break
+                continue
+            try:
+                self.annotate_packet(packet)
+            except Exception as e:
+                print(f"Error in annotation loop: {e}")
+
+    def process_packet(self, pose, packet):
+        """Run pose detection on a packet and update the form state"""
+        import time
+
+        skipped = None
+        if not self.scheduler.should_infer(packet.timestamp):
+            skipped = "frames_predicted"
+        elif self.gate_active and not self.pass_motion_gate(packet):
+            skipped = "frames_gated"
+        if skipped:
+            # Skipped frames are drawn with the skeleton predicted from the
+            # last inferences instead of being published bare
+            if self.people is not None:
+                packet.people = self.last_people
+            else:
+                packet.landmarks = self.predictor.predict(packet.timestamp)
+            packet.predicted = True
+            self.metrics.increment(skipped)
+            return
+
+        if self.people is not None:
+            self.process_people(packet)
+            return
+
+        # Near-identical frames (a static scene, a re-analysed clip) reuse
+        # an earlier result instead of running the model again
+        hit = False
+        if self.pose_cache is not None:
+            key, hit, landmarks = self.pose_cache.lookup(packet.frame)
+        if hit:
+            self.metrics.increment("frames_cached")
+        else:
+            landmarks = self.infer_landmarks(pose, packet)
+            if self.pose_cache is not None:
+                self.pose_cache.store(key, landmarks)
+        finished = time.perf_counter()
+
+        h, w, _ = packet.frame.shape
+        if landmarks is None:
+            # If no landmarks, continue displaying last feedback without change
+            self.predictor.update(packet.timestamp, None)
+            self._publish(seq=packet.seq, timestamp=packet.timestamp, landmarks=None, angles=None)
+            return
+
+        packet.landmarks = landmarks
+        if self.smoother is not None:
+            packet.landmarks = self.smoother.update(packet.media_time, packet.landmarks)
+        self.predictor.update(packet.timestamp, packet.landmarks)
+
+        # Every tracked joint angle, both sides, in one batched call
+        packet.angles = compute_angles(packet.landmarks, w, h)
+        self.metrics.since("angles", finished)
+        # Published snapshots share these arrays with the packet
+        packet.landmarks.flags.writeable = False
+        packet.angles.flags.writeable = False
+
+        # All of the exercise's rules are checked together
+        rules = self.current_rules()
+        if rules is None:
+            self._publish(seq=packet.seq, timestamp=packet.timestamp, landmarks=packet.landmarks, angles=packet.angles)
+            return
+        changes, form_changed, alarm, rep_completed = score_frame(
+            rules, self.form_monitor, self.rep_counter, packet.landmarks, packet.angles, packet.media_time,
+            self.snapshot.feedback,
+        )
+
+        # Angle text and feedback update instantly; status subscribers are
+        # only woken when something they show changed
+        self._publish(
+            new_alarms=int(alarm),
+            seq=packet.seq,
+            timestamp=packet.timestamp,
+            landmarks=packet.landmarks,
+            angles=packet.angles,
+            **changes,
+        )
+        packet.alarm = alarm
+        self.emit_form_events(changes, form_changed, alarm, rep_completed)
+
+    def emit_form_events(self, changes, form_changed, alarm, rep_completed, **labels):
+        """Queue the events one scored frame produced"""
+        # Only queued here; the bus's dispatcher thread runs the sinks
+        exercise_type = changes["exercise_type"]
+        if form_changed:
+            self.events.emit(
+                "form", exercise_type=exercise_type, form_status=changes["form_status"],
+                feedback=changes["feedback"], **labels,
+            )
+        if rep_completed:
+            self.events.emit(
+                "rep", exercise_type=exercise_type, **{field: changes[field] for field in NO_REPS}, **labels
+            )
+        if alarm:
+            self.metrics.increment("alarms")
+            self.events.emit("alarm", exercise_type=exercise_type, feedback=changes["feedback"], **labels)
+
+    def process_people(self, packet):
+        """Multi-person counterpart of process_packet: score everyone in view"""
+        import time
+
+        started = time.perf_counter()
+        tracks = self.people.update(packet.frame, packet.media_time)
+        finished = time.perf_counter()
+        self.scheduler.record(started, finished)
+        self.metrics.observe("people", finished - started)
+        self.metrics.increment("frames_inferred")
+
+        h, w = packet.frame.shape[:2]
+        exercise = self.exercises.get(self.exercise_type)
+        states = {}
+        people = []
+        shown = []
+        alarms = 0
+        primary = None
+        for track in tracks:
+            state = self.person_states.get(track.id)
+            if state is None or state.exercise is not exercise:
+                state = PersonState(track.id, exercise, smoothing=self.smoother is not None)
+            states[track.id] = state
+            if track.missed == 0:
+                form_changed, alarm, rep_completed = state.update(packet.media_time, track.landmarks, w, h)
+                alarms += alarm
+                if exercise is not None:
+                    self.emit_form_events(state.changes, form_changed, alarm, rep_completed, person=track.id)
+                shown.append((track.id, state.landmarks, state.changes["form_status"], state.label()))
+                # The largest person in view drives the single-person fields
+                if primary is None or track.area > primary[0].area:
+                    primary = (track, state)
+            people.append(state.status(track.box))
+        self.person_states = states
+
+        packet.people = self.last_people = shown
+        changes = {}
+        if primary is not None:
+            packet.landmarks = primary[1].landmarks
+            packet.angles = primary[1].angles
+            packet.alarm = alarms > 0
+            changes = primary[1].changes if exercise is not None else {}
+        self._publish(
+            new_alarms=alarms,
+            seq=packet.seq,
+            timestamp=packet.timestamp,
+            landmarks=packet.landmarks,
+            angles=packet.angles,
+            people=tuple(people),
+            **changes,
+        )
+
+    def pass_motion_gate(self, packet):
+        """Check a packet against the motion gate, publishing gate state changes"""
+        state = self.motion_gate.state
+        passed = self.motion_gate.check(packet.frame, packet.timestamp)
+        if self.motion_gate.state != state:
+            self._publish(motion=self.motion_gate.state)
+        return passed
+
+    def infer_landmarks(self, pose, packet):
+        """Run the pose model on a packet's frame; full-frame landmarks or None"""
+        import time
+
+        # Convert to RGB for pose detection; drawing happens later on the
+        # original BGR frame so there is no need to convert back
+        convert_started = time.perf_counter()
+        image = packet.frame
+        if self.roi is not None:
+            image, transform = self.roi.prepare(image)
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        image_rgb.flags.writeable = False
+        started = time.perf_counter()
+        self.metrics.observe("convert", started - convert_started)
+        results = pose.process(image_rgb)
+        finished = time.perf_counter()
+        self.scheduler.record(started, finished)
+        self.metrics.observe("pose", finished - started)
+        self.metrics.increment("frames_inferred")
+        packet.results = results
+
+        h, w, _ = packet.frame.shape
+        if not results.pose_landmarks:
+            if self.roi is not None:
+                self.roi.update(None, w, h)
+            return None
+
+        landmarks = landmarks_to_array(results.pose_landmarks)
+        if self.roi is not None:
+            landmarks = self.roi.map_back(landmarks, transform)
+            self.roi.update(landmarks, w, h)
+        return landmarks
+
+    def record_packet(self, packet):
+        """Append an inferred packet and the state it produced to the recording"""
+        snapshot = self.snapshot
+        self.recorder.write(
+            packet.media_time,
+            packet.seq,
+            packet.landmarks,
+            packet.angles,
+            form_status=snapshot.form_status,
+            alarm=packet.alarm,
+            reps=snapshot.reps,
+            phase=snapshot.phase,
+        )
+
+    def annotate_packet(self, packet):
+        """Publish the packet's frame with the overlay composited on top"""
+        import time
+        started = time.perf_counter()
+        if self.video_demand is None or self.video_demand():
+            draw = None
+            if self.overlay is not None:
+                def draw(canvas):
+                    drawing = time.perf_counter()
+                    self.overlay.render(canvas, packet.landmarks, self.snapshot, packet.alarm, packet.people)
+                    self.metrics.since("draw", drawing)
+            self.publish_frame(packet.frame, packet.timestamp, draw)
+            self.metrics.since("publish", started)
+        else:
+            # Nobody is watching; status and metrics need no pixels
+            self.metrics.increment("frames_unrendered")
+        if self.start_requested is not None:
+            # start() to first processed frame, including model warm-up
+            first_frame = time.perf_counter() - self.start_requested
+            self.metrics.observe("first_frame", first_frame)
+            self.start_requested = None
+            print(f"First frame ready {first_frame * 1000:.0f} ms after start")
+
+    def publish_frame(self, image, timestamp=None, draw=None):
+        """Copy a frame into the ring buffer for consumers and publish it.
+
+        draw(canvas), if given, paints onto the ring's copy before it is
+        published. The source frame may belong to the caller (ArraySource
+        hands out the caller's arrays), so it is never drawn on.
+        """
+        ring = self.frame_buffer
+        if ring is None or ring.shape != image.shape:
+            if ring is not None and ring.shared:
+                # Shared rings have a fixed size other processes rely on
+                image = cv2.resize(image, (ring.shape[1], ring.shape[0]))
+            else:
+                ring = self.frame_buffer = FrameRingBuffer(image.shape)
+        canvas = ring.begin_write()
+        np.copyto(canvas, image)
+        if draw is not None:
+            draw(canvas)
+        return ring.commit(timestamp)
+
+    @property
+    def current_frame(self):
+        """Read-only view of the newest published frame, or None"""
+        if self.frame_buffer is None:
+            return None
+        return self.frame_buffer.latest()[1]
+
+    def pipeline_stats(self):
+        """Queue depth and drop counts for each pipeline stage"""
+        stats = {}
+        for queue in (self.capture_queue, self.render_queue):
+            if queue is not None:
+                stats[queue.name] = queue.stats()
+        stats["scheduler"] = self.scheduler.stats()
+        if self.roi is not None:
+            stats["roi"] = self.roi.stats()
+        if self.pose_cache is not None:
+            stats["pose_cache"] = self.pose_cache.stats()
+        if self.gate_active:
+            stats["motion_gate"] = self.motion_gate.stats()
+        if self.overlay is not None:
+            stats["overlay"] = self.overlay.stats()
+        stats["events"] = self.events.stats()
+        if self.people is not None:
+            stats["people"] = self.people.stats()
+        return stats
+
+    def _publish(self, new_alarms=0, **changes):
+        """Swap in a new snapshot with some fields changed; returns it"""
+        with self.lock:
+            old = self.snapshot
+            if new_alarms:
+                changes["alarm_count"] = old.alarm_count + new_alarms
+            new = old._replace(version=old.version + 1, **changes)
+            status_changed = any(
+                getattr(new, field) != getattr(old, field) for field in changes if field in STATUS_FIELDS
+            )
+            if status_changed:
+                new = new._replace(status_version=old.status_version + 1)
+            # A single reference assignment; readers never see a half-built state
+            self.snapshot = new
+            if status_changed:
+                self.status_changed.notify_all()
+        return new
+
+    def get_status(self):
+        """Consistent copy of the status fields shown to users"""
+        return self.snapshot.status()
+
+    def wait_for_status(self, since_version, timeout=None):
+        """Block until the status changes past since_version.
+
+        Returns the new status, or None if nothing changed before the
+        timeout.
+        """
+        snapshot = self.snapshot
+        if snapshot.status_version <= since_version:
+            with self.lock:
+                self.status_changed.wait_for(
+                    lambda: self.snapshot.status_version > since_version, timeout
+                )
+            snapshot = self.snapshot
+            if snapshot.status_version <= since_version:
+                return None
+        return snapshot.status()
 
     def start(self):
         """Start the exercise detection"""
         if not self.running:
+            import time
+
             self.running = True
+            self.start_requested = time.perf_counter()
+            self._publish(running=True, exercise_type=self.exercise_type)
             self.detection_thread = threading.Thread(target=self.detection_loop)
             self.detection_thread.start()
 
     def stop(self):
         """Stop the exercise detection"""
         self.running = False
+        self._publish(running=False)
         if self.detection_thread:
             self.detection_thread.join()
-        if self.cap:
-            self.cap.release()
+        self.source.release()
         cv2.destroyAllWindows()
 
 
-class ExerciseGUI:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Exercise Form Monitor")
-        self.root.geometry("800x600")
-        
-        # Create ExerciseDetector instance
-        self.detector = ExerciseDetector()
-        
-        # Create UI elements
-        self.create_widgets()
-        
-        # Update flag
-        self.is_updating = False
-        
-    def create_widgets(self):
-        # Top frame for controls
-        control_frame = ttk.Frame(self.root)
-        control_frame.pack(fill=tk.X, padx=10, pady=10)
-        
-        # Start/Stop button
-        self.start_stop_btn = ttk.Button(control_frame, text="Start", command=self.toggle_detection)
-        self.start_stop_btn.pack(side=tk.LEFT, padx=5)
-        
-        # Exercise selection
-        ttk.Label(control_frame, text="Exercise:").pack(side=tk.LEFT, padx=5)
-        
-        self.exercise_var = tk.StringVar(value="hand_raise")
-        exercise_combo = ttk.Combobox(
-            control_frame, 
-            textvariable=self.exercise_var,
-            values=["hand_raise", "hand_curl"],
-            state="readonly",
-            width=15
-        )
-        exercise_combo.pack(side=tk.LEFT, padx=5)
-        exercise_combo.bind("<<ComboboxSelected>>", self.change_exercise)
-        
-        # Status labels
-        status_frame = ttk.Frame(self.root)
-        status_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
-        
-        self.angle_label = ttk.Label(status_frame, text="Angle: Not detected")
-        self.angle_label.pack(side=tk.LEFT, padx=5)
-        
-        self.feedback_label = ttk.Label(status_frame, text="")
-        self.feedback_label.pack(side=tk.RIGHT, padx=5)
-        
-        # Video frame
-        self.video_frame = ttk.Frame(self.root, borderwidth=2, relief="groove")
-        self.video_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        self.video_label = ttk.Label(self.video_frame)
-        self.video_label.pack(fill=tk.BOTH, expand=True)
-        
-        # Instructions label
-        instructions = (
-            "Instructions:\n"
-            "1. Select an exercise type from the dropdown menu\n"
-            "2. Click 'Start' to begin monitoring\n"
-            "3. Position yourself so your body is visible in the camera\n"
-            "4. For Hand Raise: Raise your arm straight up\n"
-            "5. For Hand Curl: Perform bicep curls with proper form"
-        )
-        
-        ttk.Label(self.root, text=instructions, justify=tk.LEFT).pack(
-            padx=10, pady=(0, 10), anchor=tk.W
-        )
-        
-    def update_video(self):
-        if self.detector.running and self.detector.current_frame is not None:
-            # Convert OpenCV image to PIL format for Tkinter
-            image = Image.fromarray(self.detector.current_frame)
-            
-            # Resize to fit the frame if needed
-            frame_width = self.video_frame.winfo_width()
-            frame_height = self.video_frame.winfo_height()
-            
-            if frame_width > 1 and frame_height > 1:
-                image = image.resize((frame_width, frame_height), Image.LANCZOS)
-                
-            # Convert to Tkinter format
-            img_tk = ImageTk.PhotoImage(image=image)
-            
-            # Update label
-            self.video_label.configure(image=img_tk)
-            self.video_label.image = img_tk
-            
-            # Update status labels
-            self.angle_label.configure(text=self.detector.angle_text if self.detector.angle_text else "Angle: Not detected")
-            
-            if self.detector.form_status == "good":
-                self.feedback_label.configure(text=self.detector.feedback_text, foreground="green")
-            elif self.detector.form_status == "bad":
-                self.feedback_label.configure(text=self.detector.feedback_text, foreground="red")
-            else:
-                self.feedback_label.configure(text="")
-                
-        # Schedule the next update
-        if self.is_updating:
-            self.root.after(30, self.update_video)
-    
-    def toggle_detection(self):
-        if not self.detector.running:
-            # Start detection
-            self.detector.start()
-            self.start_stop_btn.configure(text="Stop")
-            self.is_updating = True
-            self.update_video()
-        else:
-            # Stop detection
-            self.detector.stop()
-            self.start_stop_btn.configure(text="Start")
-            self.is_updating = False
-    
-    def change_exercise(self, event=None):
-        self.detector.exercise_type = self.exercise_var.get()
-        
-    def on_closing(self):
-        if self.detector.running:
-            self.detector.stop()
-        self.root.destroy()
+if __name__ == "__main__":
+    import sys
 
+    # `python -m posture_detection analyze <files...>` scores recorded
+    # sessions offline; without arguments the desktop GUI starts
+    if len(sys.argv) > 1 and sys.argv[1] == "analyze":
+        from batch import main
 
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = ExerciseGUI(root)
-    root.protocol("WM_DELETE_WINDOW", app.on_closing)
-    root.mainloop()
+        sys.exit(main(sys.argv[2:]))
+    # `python -m posture_detection replay <file.poselog>` re-scores a recording
+    if len(sys.argv) > 1 and sys.argv[1] == "replay":
+        from recording import main
+
+        sys.exit(main(sys.argv[2:]))
+
+    from gui import main
+
+    main()
@@ -0,0 +1,193 @@
+"""
+Session recordings: an append-only log of what the detector saw.
+
+A recording is a small JSON header followed by fixed-size binary records,
+one per inferred frame, holding the landmarks, joint angles and the form
+state that was reported. Replaying memory-maps the records, so rules and
+analytics can be re-run over hours of data without decoding video or
+running the pose model again. A truncated last record (e.g. after a crash)
+is ignored.
+
+    python -m posture_detection replay session.poselog --exercise squat
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from batch import FORM_STATUS_CODES
+from landmarks import ANGLE_NAMES, NUM_LANDMARKS, joint_visibility
+from reps import PHASE_CODES, RepCounter, count_reps
+from rules import RuleEvaluator, load_exercises
+
+MAGIC = b"POSELOG1"
+HEADER_ALIGN = 64  # Records start on a 64-byte boundary
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),  # Seconds since the recording started
+    ("seq", "<u8"),
+    ("detected", "?"),
+    ("alarm", "?"),
+    ("form_status", "u1"),
+    ("phase", "u1"),
+    ("reps", "<u4"),
+    ("landmarks", "<f4", (NUM_LANDMARKS, 4)),
+    ("angles", "<f4", (len(ANGLE_NAMES),)),
+])
+
+
+class SessionRecorder:
+    """Appends one fixed-size record per inferred frame to a .poselog file.
+
+    Records are collected in a preallocated block and written `flush_every`
+    at a time, so recording costs one small write per block.
+    """
+
+    def __init__(self, path, exercise_type="", flush_every=30):
+        self.path = path
+        self.block = np.zeros(flush_every, dtype=RECORD_DTYPE)
+        self.pending = 0
+        self.count = 0
+        self.started = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "wb")
+        header = json.dumps({
+            "version": 1,
+            "exercise_type": exercise_type,
+            "created": time.time(),
+            "angle_names": list(ANGLE_NAMES),
+            "dtype": RECORD_DTYPE.descr,
+        }).encode()
+        size = len(MAGIC) + 4 + len(header)
+        header += b" " * (-size % HEADER_ALIGN)
+        self.file.write(MAGIC + np.uint32(len(header)).tobytes() + header)
+        self.file.flush()
+
+    def write(self, timestamp, seq, landmarks=None, angles=None, form_status="", alarm=False, reps=0, phase=""):
+        if self.started is None:
+            self.started = timestamp
+        record = self.block[self.pending]
+        record["timestamp"] = timestamp - self.started
+        record["seq"] = seq
+        record["detected"] = landmarks is not None
+        record["alarm"] = alarm
+        record["form_status"] = FORM_STATUS_CODES.get(form_status, 0)
+        record["phase"] = PHASE_CODES.get(phase, 0)
+        record["reps"] = reps
+        record["landmarks"] = np.nan if landmarks is None else landmarks
+        record["angles"] = np.nan if angles is None else angles
+        self.pending += 1
+        if self.pending == len(self.block):
+            self.flush()
+
+    def flush(self):
+        if self.pending and self.file is not None:
+            self.file.write(self.block[:self.pending].tobytes())
+            self.file.flush()
+            self.count += self.pending
+            self.pending = 0
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+def open_recording(path):
+    """Return (header, records) with records a read-only memmap of RECORD_DTYPE"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a pose recording")
+        header_size = int(np.frombuffer(f.read(4), dtype=np.uint32)[0])
+        header = json.loads(f.read(header_size))
+    offset = len(MAGIC) + 4 + header_size
+    dtype = np.dtype([tuple(field) for field in header["dtype"]])
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    if count == 0:
+        return header, np.zeros(0, dtype=dtype)
+    return header, np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+
+def rescore(records, exercise, bad_frames=None, chunk_size=4096):
+    """Re-run an exercise's rules and rep counter over recorded frames.
+
+    Returns columns in the same layout as the batch analyzer, so a
+    recording can be checked against changed rules. Records are read from
+    the memmap `chunk_size` at a time, so memory stays flat however long
+    the recording is; only the small per-frame result columns grow.
+    """
+    from posture_detection import SMOOTHED_BAD_FRAMES, FormMonitor
+
+    rules = RuleEvaluator(exercise)
+    form_monitor = FormMonitor(bad_frames=bad_frames or SMOOTHED_BAD_FRAMES)
+    counter = RepCounter.from_exercise(exercise)
+    count = len(records)
+    columns = {
+        "time": np.empty(count, dtype=np.float64),
+        "detected": np.empty(count, dtype=bool),
+        "form_status": np.zeros(count, dtype=np.uint8),
+        "alarm": np.zeros(count, dtype=bool),
+    }
+    if counter is not None:
+        columns["reps"] = np.empty(count, dtype=np.int32)
+        columns["phase"] = np.empty(count, dtype=np.uint8)
+
+    for start in range(0, count, chunk_size):
+        chunk = records[start:start + chunk_size]
+        end = start + len(chunk)
+        # Small copies of this chunk only; the loop below touches single rows
+        angles = np.array(chunk["angles"])
+        # Rules skip occluded joints exactly as they did live
+        visibility = joint_visibility(chunk["landmarks"])
+        detected = np.array(chunk["detected"])
+        columns["time"][start:end] = chunk["timestamp"]
+        columns["detected"][start:end] = detected
+        status = columns["form_status"][start:end]
+        alarms = columns["alarm"][start:end]
+        for i, is_detected in enumerate(detected.tolist()):
+            # Frames without a person keep the last reported status
+            if is_detected:
+                _, alarms[i] = form_monitor.update(rules.evaluate(angles[i], visibility[i]).any())
+            status[i] = FORM_STATUS_CODES[form_monitor.form_status]
+        if counter is not None:
+            # The counter carries its state from one chunk to the next
+            columns["reps"][start:end], columns["phase"][start:end] = count_reps(
+                angles[:, counter.angle_index], columns["time"][start:end], counter
+            )
+    return columns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m posture_detection replay",
+        description="Summarise a session recording and re-run the form rules over it",
+    )
+    parser.add_argument("file", help=".poselog recording")
+    parser.add_argument("--exercise", default=None, help="exercise to score with (default: the recorded one)")
+    parser.add_argument("--out", default=None, help="write the re-scored columns to this .npz file")
+    args = parser.parse_args(argv)
+
+    header, records = open_recording(args.file)
+    exercise_type = args.exercise or header["exercise_type"]
+    exercises = load_exercises()
+    if exercise_type not in exercises:
+        parser.error(f"unknown exercise {exercise_type!r}")
+
+    duration = float(records["timestamp"][-1]) if len(records) else 0.0
+    print(f"{args.file}: {len(records)} frames over {duration:.1f}s, recorded as {header['exercise_type']}")
+    print(f"  recorded: {int(records['alarm'].sum())} alarm(s), {int(records['reps'][-1]) if len(records) else 0} rep(s)")
+
+    started = time.perf_counter()
+    columns = rescore(records, exercises[exercise_type])
+    elapsed = time.perf_counter() - started
+    reps = int(columns["reps"][-1]) if "reps" in columns and len(records) else 0
+    print(f"  re-scored as {exercise_type}: {int(columns['alarm'].sum())} alarm(s), {reps} rep(s) in {elapsed * 1000:.0f} ms")
+    if args.out:
+        np.savez_compressed(args.out, **columns)
+        print(f"  columns written to {args.out}")
+    return 0
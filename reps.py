@@ -0,0 +1,128 @@
+"""
+Rep counting, movement phase and tempo from a stream of joint angles.
+
+An exercise's "phases" entry (see exercises.json) names the angle that
+drives the movement and two thresholds. A rep starts at one threshold,
+reaches the other and comes back; with "invert" the rep starts at the high
+threshold (e.g. a curl or squat starting from a straight joint). Updates
+are O(1) with constant state per session, and the same RepCounter scores
+recorded angle arrays in batch.
+"""
+import numpy as np
+
+from landmarks import ANGLE_INDEX
+
+# Movement phases: "up" moves away from the starting position towards the
+# rep's target, "down" returns to the start, "hold" is a pause in either
+PHASES = ("", "up", "down", "hold")
+PHASE_CODES = {phase: code for code, phase in enumerate(PHASES)}
+
+# Status fields before any rep has been seen
+NO_REPS = {"reps": 0, "phase": "", "last_rep_time": None, "avg_rep_time": None}
+
+
+class RepCounter:
+    """Streaming rep counter and phase detector for one angle"""
+
+    def __init__(self, low, high, invert=False, hold_speed=20.0, smoothing=0.3, tempo_smoothing=0.3):
+        self.low = low
+        self.high = high
+        self.invert = invert
+        self.hold_speed = hold_speed  # Below this many degrees/s the movement is held
+        self.smoothing = smoothing  # EMA weight for the angular velocity
+        self.tempo_smoothing = tempo_smoothing  # EMA weight for the average rep time
+        self.angle_index = None  # Column of the driving angle in landmarks.ANGLE_NAMES
+        self.reset()
+
+    @classmethod
+    def from_exercise(cls, exercise, **kwargs):
+        """Counter for an ExerciseDefinition, or None if it has no phases"""
+        phases = exercise.phases
+        if not phases:
+            return None
+        counter = cls(phases["low"], phases["high"], phases.get("invert", False), **kwargs)
+        counter.angle_index = ANGLE_INDEX[phases["angle"]]
+        return counter
+
+    def reset(self):
+        self.reps = 0
+        self.phase = ""
+        self.at_start = False  # Rep can only begin from the starting position
+        self.reached_target = False
+        self.rep_started = None  # When the current rep left the start
+        self.last_rep_time = None
+        self.avg_rep_time = None
+        self.velocity = 0.0  # Smoothed progress rate, degrees/s towards the target
+        self._last_angle = None
+        self._last_time = None
+
+    def _progress(self, angle):
+        """0 at the starting threshold, 1 at the target threshold"""
+        progress = (angle - self.low) / (self.high - self.low)
+        return 1.0 - progress if self.invert else progress
+
+    def update(self, angle, timestamp):
+        """Feed one angle sample (NaN when not detected); returns True when a rep completes"""
+        if angle is None or np.isnan(angle):
+            return False
+
+        if self._last_time is not None and timestamp > self._last_time:
+            delta = angle - self._last_angle
+            speed = (-delta if self.invert else delta) / (timestamp - self._last_time)
+            self.velocity += self.smoothing * (speed - self.velocity)
+        self._last_angle = angle
+        self._last_time = timestamp
+
+        progress = self._progress(angle)
+        completed = False
+        if progress <= 0.0:
+            if self.reached_target:
+                self.reps += 1
+                completed = True
+                if self.rep_started is not None:
+                    self.last_rep_time = timestamp - self.rep_started
+                    if self.avg_rep_time is None:
+                        self.avg_rep_time = self.last_rep_time
+                    else:
+                        self.avg_rep_time += self.tempo_smoothing * (self.last_rep_time - self.avg_rep_time)
+            self.at_start = True
+            self.reached_target = False
+            self.rep_started = None
+        elif self.at_start:
+            if self.rep_started is None:
+                self.rep_started = timestamp
+            if progress >= 1.0:
+                self.reached_target = True
+
+        if not self.at_start:
+            self.phase = ""
+        elif abs(self.velocity) < self.hold_speed:
+            self.phase = "hold"
+        else:
+            self.phase = "up" if self.velocity > 0 else "down"
+        return completed
+
+    def status(self):
+        return {
+            "reps": self.reps,
+            "phase": self.phase,
+            "last_rep_time": self.last_rep_time,
+            "avg_rep_time": self.avg_rep_time,
+        }
+
+
+def count_reps(angles, timestamps, counter):
+    """Run a RepCounter over recorded angles.
+
+    Returns (reps, phase) arrays with the running rep count and the
+    PHASE_CODES phase at every frame.
+    """
+    angles = np.asarray(angles, dtype=np.float64)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    reps = np.empty(len(angles), dtype=np.int32)
+    phases = np.empty(len(angles), dtype=np.uint8)
+    for i, (angle, timestamp) in enumerate(zip(angles.tolist(), timestamps.tolist())):
+        counter.update(angle, timestamp)
+        reps[i] = counter.reps
+        phases[i] = PHASE_CODES[counter.phase]
+    return reps, phases
@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+
+
+class RoiTracker:
+    """Crops pose inference to the region around the person.
+
+    The previous frame's landmarks give a padded bounding box; the next
+    frame is cropped to it and downscaled so its longest side is at most
+    `inference_size` pixels before it reaches the model. Landmarks come back
+    normalised to the crop and are mapped to full-frame coordinates. When
+    the person is lost the tracker falls back to a downscaled full-frame
+    search.
+
+    The box only moves once the person gets close to its edge, which keeps
+    the crop steady between frames (MediaPipe's own tracker relies on
+    consecutive inputs looking alike).
+    """
+
+    def __init__(self, inference_size=256, padding=0.3, min_visibility=0.5, min_landmarks=8, margin=0.1):
+        self.inference_size = inference_size
+        self.padding = padding  # Extra space around the landmarks, relative to box size
+        self.min_visibility = min_visibility
+        self.min_landmarks = min_landmarks  # Fewer visible landmarks means tracking is lost
+        self.margin = margin  # How close to the edge landmarks may get before re-centring
+        self.box = None  # (x0, y0, x1, y1) in full-frame pixels
+        self.tracked = 0
+        self.full_frame = 0
+
+    def reset(self):
+        self.box = None
+
+    def prepare(self, frame):
+        """Return (image for inference, transform for map_back)"""
+        h, w = frame.shape[:2]
+        if self.box is not None:
+            x0, y0, x1, y1 = self.box
+            image = frame[y0:y1, x0:x1]
+            self.tracked += 1
+        else:
+            x0, y0, x1, y1 = 0, 0, w, h
+            image = frame
+            self.full_frame += 1
+
+        crop_w, crop_h = x1 - x0, y1 - y0
+        scale = self.inference_size / max(crop_w, crop_h) if self.inference_size else 1.0
+        if scale < 1.0:
+            size = (max(1, round(crop_w * scale)), max(1, round(crop_h * scale)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return image, (x0, y0, crop_w, crop_h, w, h)
+
+    def map_back(self, landmarks, transform):
+        """Map crop-normalised landmarks to full-frame normalised ones"""
+        x0, y0, crop_w, crop_h, w, h = transform
+        mapped = landmarks.copy()
+        mapped[:, 0] = (landmarks[:, 0] * crop_w + x0) / w
+        mapped[:, 1] = (landmarks[:, 1] * crop_h + y0) / h
+        # MediaPipe's z uses the same scale as x
+        mapped[:, 2] = landmarks[:, 2] * crop_w / w
+        return mapped
+
+    def update(self, landmarks, w, h):
+        """Pick the crop for the next frame from this frame's landmarks"""
+        if landmarks is None:
+            self.box = None
+            return
+        visible = landmarks[landmarks[:, 3] >= self.min_visibility, :2]
+        if len(visible) < self.min_landmarks:
+            self.box = None
+            return
+
+        (min_x, min_y), (max_x, max_y) = visible.min(axis=0) * (w, h), visible.max(axis=0) * (w, h)
+        if self.box is not None:
+            x0, y0, x1, y1 = self.box
+            inset_x = (x1 - x0) * self.margin
+            inset_y = (y1 - y0) * self.margin
+            if (min_x >= x0 + inset_x and max_x <= x1 - inset_x
+                    and min_y >= y0 + inset_y and max_y <= y1 - inset_y):
+                return
+
+        self.focus(min_x, min_y, max_x, max_y, w, h)
+
+    def focus(self, min_x, min_y, max_x, max_y, w, h):
+        """Crop the next frames around a person's bounding box (pixels)"""
+        # Square box around the person so limbs can move without leaving it
+        side = max(max_x - min_x, max_y - min_y) * (1 + 2 * self.padding)
+        cx, cy = (min_x + max_x) / 2, (min_y + max_y) / 2
+        x0 = int(np.clip(cx - side / 2, 0, w - 1))
+        y0 = int(np.clip(cy - side / 2, 0, h - 1))
+        x1 = int(np.clip(cx + side / 2, x0 + 1, w))
+        y1 = int(np.clip(cy + side / 2, y0 + 1, h))
+        if (x1 - x0) * (y1 - y0) >= 0.9 * w * h:
+            # Person fills the frame; cropping would not save anything
+            self.box = None
+        else:
+            self.box = (x0, y0, x1, y1)
+
+    def stats(self):
+        return {"box": self.box, "tracked": self.tracked, "full_frame": self.full_frame}
@@ -0,0 +1,108 @@
+"""
+Declarative exercise definitions compiled into array-based form checks.
+
+Exercises live in exercises.json (or a YAML file with the same layout when
+PyYAML is installed). Each one lists angle rules, a joint angle from
+landmarks.ANGLE_NAMES with an allowed min and/or max plus the feedback shown
+when it is violated. Loading compiles every exercise's rules into index and
+threshold arrays, so a frame is checked against all rules with a handful
+of NumPy operations however many rules there are.
+"""
+import json
+import os
+
+import numpy as np
+
+from landmarks import ANGLE_INDEX
+
+DEFAULT_EXERCISES_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "exercises.json")
+DEFAULT_GOOD_MESSAGE = "Good Form!"
+
+_cache = {}
+
+
+class ExerciseDefinition:
+    """One exercise with its rules compiled to arrays"""
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.label = spec.get("label", name.replace("_", " ").title())
+        self.instructions = spec.get("instructions", "")
+        self.display_angle = spec.get("display_angle")
+        self.display_index = ANGLE_INDEX[self.display_angle] if self.display_angle else None
+        self.angle_label = spec.get("angle_label", "Angle")
+        self.good_message = spec.get("good_message", DEFAULT_GOOD_MESSAGE)
+        self.phases = spec.get("phases")
+        self.min_visibility = spec.get("min_visibility", 0.5)
+
+        rules = spec.get("rules", [])
+        for rule in rules:
+            if rule["angle"] not in ANGLE_INDEX:
+                raise ValueError(f"{name}: unknown angle {rule['angle']!r}")
+        self.rule_names = [rule.get("name", rule["angle"]) for rule in rules]
+        self.messages = [rule.get("message", "Warning: Check your form") for rule in rules]
+        self.angle_indices = np.array([ANGLE_INDEX[rule["angle"]] for rule in rules], dtype=np.intp)
+        self.lower = np.array([rule.get("min", -np.inf) for rule in rules], dtype=np.float32)
+        self.upper = np.array([rule.get("max", np.inf) for rule in rules], dtype=np.float32)
+        self.hysteresis = np.array([rule.get("hysteresis", 0) for rule in rules], dtype=np.float32)
+
+    def violations(self, angles, visibility=None, active=None):
+        """Boolean array of violated rules for (J,) or (N, J) angles.
+
+        `active` is the previous frame's result; rules that were already
+        violated must come back inside their range by the hysteresis margin
+        before they clear. Angles whose joints are not visible never count.
+        """
+        values = np.asarray(angles)[..., self.angle_indices]
+        if active is None:
+            lower, upper = self.lower, self.upper
+        else:
+            lower = np.where(active, self.lower + self.hysteresis, self.lower)
+            upper = np.where(active, self.upper - self.hysteresis, self.upper)
+        # Comparisons with NaN (joint not detected) are False
+        violated = (values < lower) | (values > upper)
+        if visibility is not None:
+            violated &= np.asarray(visibility)[..., self.angle_indices] >= self.min_visibility
+        return violated
+
+    def message(self, violated):
+        """Feedback for the first violated rule"""
+        hits = np.flatnonzero(violated)
+        return self.messages[hits[0]] if len(hits) else self.good_message
+
+    def angle_text(self, angles):
+        if self.display_index is None:
+            return ""
+        return f"{self.angle_label}: {int(angles[self.display_index])}°"
+
+
+class RuleEvaluator:
+    """Streams frames through an exercise's rules, keeping hysteresis state"""
+
+    def __init__(self, exercise):
+        self.exercise = exercise
+        self.active = np.zeros(len(exercise.rule_names), dtype=bool)
+
+    def evaluate(self, angles, visibility=None):
+        self.active = self.exercise.violations(angles, visibility, self.active)
+        return self.active
+
+
+def _read(path):
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def load_exercises(path=None):
+    """Load and compile exercise definitions once per path"""
+    path = path or os.environ.get("POSTURE_EXERCISES", DEFAULT_EXERCISES_PATH)
+    exercises = _cache.get(path)
+    if exercises is None:
+        specs = _read(path)
+        exercises = {name: ExerciseDefinition(name, spec) for name, spec in specs.items()}
+        _cache[path] = exercises
+    return exercises
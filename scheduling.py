@@ -0,0 +1,105 @@
+import time
+
+
+class InferenceScheduler:
+    """Decides which captured frames are sent through the pose model.
+
+    The inference interval is derived from the measured pose.process()
+    latency: the model may use at most `cpu_budget` of one core and is never
+    run faster than `target_fps`. A fast machine therefore infers every
+    frame, while a slow one spreads inference out and lets the predictor fill
+    in the frames in between.
+    """
+
+    def __init__(self, target_fps=30.0, cpu_budget=0.8, adaptive=True, smoothing=0.2):
+        self.target_fps = target_fps
+        self.cpu_budget = cpu_budget
+        self.adaptive = adaptive
+        self.smoothing = smoothing  # EMA weight for new latency samples
+        self.latency = None  # Smoothed pose.process() latency in seconds
+        self.last_inference = None
+        self.inferred = 0
+        self.skipped = 0
+
+    @property
+    def interval(self):
+        """Minimum time between two inferences"""
+        interval = 1.0 / self.target_fps if self.target_fps else 0.0
+        if self.latency is not None and self.cpu_budget:
+            interval = max(interval, self.latency / self.cpu_budget)
+        return interval
+
+    def should_infer(self, now=None):
+        if not self.adaptive or self.last_inference is None:
+            return True
+        now = time.perf_counter() if now is None else now
+        if now - self.last_inference >= self.interval:
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self, started, finished):
+        """Report the start and end time of an inference"""
+        latency = finished - started
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+        self.last_inference = started
+        self.inferred += 1
+
+    def stats(self):
+        return {
+            "adaptive": self.adaptive,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 2),
+            "interval_ms": round(self.interval * 1000, 2),
+            "inferred": self.inferred,
+            "skipped": self.skipped,
+        }
+
+
+class LandmarkPredictor:
+    """Estimates landmarks for frames that skipped inference.
+
+    Keeps the last two inferred landmark arrays and interpolates between
+    them, or extrapolates with constant velocity past the newest one.
+    Extrapolation is capped at `max_extrapolation` seconds so a missed
+    detection does not send the skeleton flying off screen.
+    """
+
+    def __init__(self, max_extrapolation=0.25):
+        self.max_extrapolation = max_extrapolation
+        self.reset()
+
+    def reset(self):
+        self.previous = None  # (timestamp, landmarks)
+        self.latest = None
+
+    def update(self, timestamp, landmarks):
+        if landmarks is None:
+            # Lost the person; don't keep drawing a stale skeleton
+            self.reset()
+            return
+        self.previous = self.latest
+        self.latest = (timestamp, landmarks)
+
+    def predict(self, timestamp):
+        if self.latest is None:
+            return None
+        t1, latest = self.latest
+        if self.previous is None:
+            return latest
+        t0, previous = self.previous
+        span = t1 - t0
+        if span <= 0:
+            return latest
+
+        if timestamp <= t1:
+            weight = max((timestamp - t0) / span, 0.0)
+        else:
+            weight = 1.0 + min(timestamp - t1, self.max_extrapolation) / span
+
+        predicted = latest.copy()
+        # Only positions move; visibility is kept from the newest inference
+        predicted[:, :3] = previous[:, :3] + weight * (latest[:, :3] - previous[:, :3])
+        return predicted
@@ -0,0 +1,339 @@
+import os
+import re
+import threading
+import time
+
+from metrics import render_prometheus
+from events import AudioSink, EventBus
+from pose_pool import PosePool
+from posture_detection import ExerciseDetector
+from reps import NO_REPS
+from streaming import MJPEGBroadcaster, landmark_message
+
+DEFAULT_SESSION = "default"
+
+# Status reported for a session that has never been started
+IDLE_STATUS = {
+    "running": False,
+    "feedback": "",
+    "angle": "",
+    "form_status": "",
+    "exercise_type": "",
+    "alarm_count": 0,
+    "recording": None,
+    "motion": None,
+    "people": None,
+    **NO_REPS,
+}
+
+
+class SessionError(Exception):
+    """A session request that cannot be honoured; carries an HTTP status"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SessionLimits:
+    """Resource limits applied to every session on a server"""
+
+    def __init__(self, max_sessions=8, max_fps=30.0, cpu_budget=0.8, max_viewers=4):
+        self.max_sessions = max_sessions  # Concurrently running detectors
+        self.max_fps = max_fps  # Inference rate cap per session
+        self.cpu_budget = cpu_budget  # Share of one core each session's model may use
+        self.max_viewers = max_viewers  # /video_feed clients per session
+
+
+class Session:
+    """One monitored person: a detector plus the stream serving its video"""
+
+    def __init__(self, session_id, detector, event_sinks=()):
+        self.id = session_id
+        self.detector = detector
+        self.created = time.time()
+        self.broadcaster = MJPEGBroadcaster(self.current_ring)
+        # Outlives restarts, so there is one dispatcher thread per session
+        self.events = EventBus([AudioSink(), *event_sinks], labels={"session": session_id})
+
+    def current_ring(self):
+        detector = self.detector
+        if detector is not None and detector.running:
+            return detector.frame_buffer
+        return None
+
+    @property
+    def running(self):
+        return self.detector is not None and self.detector.running
+
+    def status(self):
+        status = self.detector.get_status()
+        status["session_id"] = self.id
+        status["pipeline"] = self.detector.pipeline_stats()
+        status["stream"] = self.broadcaster.stats()
+        status["metrics"] = self.detector.metrics.summary()
+        status["stream_metrics"] = self.broadcaster.metrics.summary()
+        return status
+
+
+class SessionManager:
+    """Runs many ExerciseDetector instances keyed by session id.
+
+    Sessions share one PosePool, so a model built for a finished session is
+    reused by the next one, and every detector is started with the
+    per-session limits. Stopped sessions are kept so their viewers and
+    event streams survive a restart; remove() forgets them.
+    """
+
+    def __init__(self, limits=None, pose_pool=None, recording_dir=None, event_sinks=(), source_dir=None):
+        self.limits = limits or SessionLimits()
+        # Video files and image directories clients may start from; without
+        # it only cameras can be opened
+        self.source_dir = source_dir
+        # Sinks that receive every session's events besides the alarm sound
+        self.event_sinks = list(event_sinks)
+        # Each session records into its own subdirectory when set
+        self.recording_dir = recording_dir
+        self.pose_pool = pose_pool or PosePool(max_size=self.limits.max_sessions)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        # Optional callable told the id of every removed or evicted session,
+        # so front ends can drop what they keep per session
+        self.on_remove = None
+
+    def prewarm(self, count=1):
+        """Build pose models in the background so the first /start is fast"""
+
+        def run():
+            try:
+                seconds = self.pose_pool.prewarm(count)
+                print(f"Pose model prewarmed in {seconds * 1000:.0f} ms")
+            except Exception as e:
+                print(f"Pose model prewarm failed: {e}")
+
+        thread = threading.Thread(target=run, name="pose-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            raise SessionError(f"Unknown session {session_id}", status_code=404)
+        return session
+
+    def find(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def check(self, session_id):
+        """Raise a 404 SessionError unless the session exists or is the default one"""
+        if session_id != DEFAULT_SESSION and self.find(session_id) is None:
+            raise SessionError(f"Unknown session {session_id}", status_code=404)
+
+    def ensure(self, session_id):
+        """Return a session, registering the idle default session on first use.
+
+        Any other session only exists once start() created it, so streams
+        for unknown ids cannot register sessions past the limit.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                if session_id != DEFAULT_SESSION:
+                    raise SessionError(f"Unknown session {session_id}", status_code=404)
+                session = self._sessions[session_id] = Session(session_id, None, self.event_sinks)
+            return session
+
+    def running_count(self):
+        with self._lock:
+            return sum(1 for session in self._sessions.values() if session.running)
+
+    def start(self, session_id=DEFAULT_SESSION, source=None, exercise_type="hand_raise", multi_person=False):
+        """Start detection for a session, creating the session if needed"""
+        source = self.resolve_source(source)
+        evicted = None
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and session.running:
+                raise SessionError("Detection already running")
+            running = sum(1 for s in self._sessions.values() if s.running)
+            if running >= self.limits.max_sessions:
+                raise SessionError(
+                    f"Session limit of {self.limits.max_sessions} reached", status_code=429
+                )
+
+            if session is None:
+                if len(self._sessions) >= self.limits.max_sessions:
+                    # Make room by forgetting the oldest stopped session
+                    evicted = self._evict_stopped()
+                session = Session(session_id, None, self.event_sinks)
+                self._sessions[session_id] = session
+            detector = ExerciseDetector(
+                source=source,
+                target_fps=self.limits.max_fps,
+                cpu_budget=self.limits.cpu_budget,
+                pose_pool=self.pose_pool,
+                recording_dir=self._recording_dir(session_id),
+                events=session.events,
+                multi_person=multi_person,
+            )
+            detector.exercise_type = exercise_type
+            session.detector = detector
+            # Only draw and publish frames while someone has the video open
+            detector.video_demand = session.broadcaster.has_clients
+            # Mark it running while still holding the lock so concurrent
+            # starts count it against the limit
+            detector.start()
+        if evicted is not None:
+            self._forget(evicted)
+        return session
+
+    def resolve_source(self, source):
+        """Validate a client-supplied source: a camera index, or a path under source_dir"""
+        if source is None or (isinstance(source, int) and not isinstance(source, bool)):
+            return source
+        if isinstance(source, str) and source.isdigit():
+            return int(source)
+        if isinstance(source, str) and self.source_dir:
+            root = os.path.realpath(self.source_dir)
+            # Relative paths are taken from the source directory; symlinks
+            # and ".." must not lead out of it
+            path = os.path.realpath(os.path.join(root, source))
+            if os.path.commonpath([root, path]) == root and os.path.exists(path):
+                return path
+        raise SessionError("source must be a camera index or a file in the server's source directory", 403)
+
+    def _evict_stopped(self):
+        stopped = [s for s in self._sessions.values() if not s.running and s.id != DEFAULT_SESSION]
+        if not stopped:
+            return None
+        session = min(stopped, key=lambda s: s.created)
+        del self._sessions[session.id]
+        return session
+
+    def status_updates(self, session_id, timeout=15):
+        """Blocking generator of a session's status changes.
+
+        Yields ("status", status) whenever the status changes and
+        ("alarm", {"alarm_count": n}) when an alarm fires, following the
+        session across restarts. None is yielded when nothing happened
+        within `timeout` seconds so callers can send keep-alives.
+        """
+        watched = None
+        version = -1
+        last_sent = None
+        alarm_count = 0
+
+        while True:
+            session = self.find(session_id)
+            current = session.detector if session is not None else None
+            if current is not watched:
+                # A new detection was started; follow it from the beginning
+                watched = current
+                version = -1
+                alarm_count = 0
+
+            if current is None:
+                status = None if last_sent == IDLE_STATUS else IDLE_STATUS
+                if status is None:
+                    time.sleep(min(timeout, 0.5))
+            else:
+                status = current.wait_for_status(version, timeout=timeout)
+
+            if status is None:
+                yield None
+                continue
+
+            version = status.get("version", version)
+            if status.get("alarm_count", 0) > alarm_count:
+                alarm_count = status["alarm_count"]
+                yield "alarm", {"alarm_count": alarm_count}
+            if status != last_sent:
+                last_sent = status
+                yield "status", status
+
+    def landmark_updates(self, session_id, fps=15, timeout=15):
+        """Blocking generator of a session's landmarks, at most `fps` per second.
+
+        Yields ("landmarks", message) for every new inference result (see
+        streaming.landmark_message), following the session across restarts,
+        and None when nothing new arrived within `timeout` seconds.
+        """
+        interval = 1.0 / fps
+        watched = None
+        seq = None
+        last_yield = time.monotonic()
+
+        while True:
+            time.sleep(interval)
+            session = self.find(session_id)
+            detector = session.detector if session is not None else None
+            snapshot = detector.snapshot if detector is not None and detector.running else None
+            if snapshot is not None and (detector is not watched or snapshot.seq != seq):
+                watched = detector
+                seq = snapshot.seq
+                last_yield = time.monotonic()
+                yield "landmarks", landmark_message(snapshot)
+            elif time.monotonic() - last_yield >= timeout:
+                last_yield = time.monotonic()
+                yield None
+
+    def _recording_dir(self, session_id):
+        if not self.recording_dir:
+            return None
+        # Session ids come from URLs; keep them from escaping the directory
+        return os.path.join(self.recording_dir, re.sub(r"[^\w-]", "_", session_id))
+
+    def stop(self, session_id=DEFAULT_SESSION):
+        session = self.get(session_id)
+        if not session.running:
+            raise SessionError("Detection not running")
+        session.detector.stop()
+        return session
+
+    def remove(self, session_id):
+        session = self.get(session_id)
+        if session.running:
+            session.detector.stop()
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        self._forget(session)
+
+    def _forget(self, session):
+        session.events.close()
+        if self.on_remove is not None:
+            self.on_remove(session.id)
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def stop_all(self):
+        for session in self.sessions():
+            if session.running:
+                session.detector.stop()
+
+    def metrics_text(self):
+        """Prometheus exposition of every session's pipeline metrics"""
+        entries = []
+        for session in self.sessions():
+            labels = {"session": session.id}
+            if session.detector is not None:
+                entries.append((labels, session.detector.metrics, session.detector.pipeline_stats()))
+            entries.append((labels, session.broadcaster.metrics, None))
+        return render_prometheus(entries)
+
+    def stats(self):
+        sessions = self.sessions()
+        return {
+            "sessions": len(sessions),
+            "running": self.running_count(),
+            # Running sessions whose motion gate has idled the model
+            "idle": sum(
+                1 for s in sessions
+                if s.running and s.detector.gate_active and s.detector.motion_gate.state == "idle"
+            ),
+            "max_sessions": self.limits.max_sessions,
+            "pose_pool": self.pose_pool.stats(),
+        }
@@ -0,0 +1,61 @@
+import math
+
+import numpy as np
+
+
+class LandmarkFilter:
+    """One-Euro filter over a whole (33, 4) landmark array at once.
+
+    Each coordinate is low-pass filtered with a cutoff that rises with its
+    speed: jitter on a still joint is smoothed heavily while fast movement
+    passes through with little lag, so angles are steady without waiting
+    several frames to trust them. Updates are weighted by visibility; a
+    barely visible landmark moves the estimate only a little and one below
+    `min_visibility` keeps its previous estimate.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.5, d_cutoff=1.0, min_visibility=0.3, max_gap=0.5):
+        self.min_cutoff = min_cutoff  # Hz; lower means smoother when still
+        self.beta = beta  # How quickly the cutoff opens up with speed
+        self.d_cutoff = d_cutoff  # Hz; cutoff for the speed estimate itself
+        self.min_visibility = min_visibility
+        self.max_gap = max_gap  # Seconds without an update before starting over
+        self.reset()
+
+    def reset(self):
+        self.value = None  # Filtered (33, 4) landmarks
+        self.speed = None  # Filtered per-coordinate speed, units per second
+        self.timestamp = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def update(self, timestamp, landmarks):
+        """Filter one frame of landmarks; returns the smoothed array"""
+        if landmarks is None:
+            return None
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        if self.value is None or timestamp - self.timestamp > self.max_gap or timestamp <= self.timestamp:
+            self.value = landmarks.copy()
+            self.speed = np.zeros_like(landmarks[:, :3])
+            self.timestamp = timestamp
+            return self.value.astype(np.float32)
+
+        dt = timestamp - self.timestamp
+        self.timestamp = timestamp
+        position = landmarks[:, :3]
+        previous = self.value[:, :3]
+
+        # Weight each landmark's update by how sure the model is about it
+        visibility = landmarks[:, 3:4]
+        weight = np.clip((visibility - self.min_visibility) / (1.0 - self.min_visibility), 0.0, 1.0)
+
+        speed = (position - previous) / dt
+        self.speed += weight * self._alpha(self.d_cutoff, dt) * (speed - self.speed)
+        cutoff = self.min_cutoff + self.beta * np.abs(self.speed)
+        alpha = 1.0 / (1.0 + 1.0 / (2 * np.pi * cutoff * dt))
+        self.value[:, :3] = previous + weight * alpha * (position - previous)
+        self.value[:, 3] = landmarks[:, 3]
+        return self.value.astype(np.float32)
@@ -2,13 +2,20 @@ document.addEventListener("DOMContentLoaded", function () {
   const startStopBtn = document.getElementById("startStopBtn");
   const exerciseType = document.getElementById("exerciseType");
   const angleLabel = document.getElementById("angleLabel");
+  const repsLabel = document.getElementById("repsLabel");
   const feedbackLabel = document.getElementById("feedbackLabel");
+  const videoFeed = document.getElementById("videoFeed");
+  const skeletonOnly = document.getElementById("skeletonOnly");
+  const skeletonCanvas = document.getElementById("skeletonCanvas");
 
   let isRunning = false;
   let statusInterval = null;
+  let landmarkEvents = null;
+  let connections = [];
 
-  // Check initial status
+  // Check initial status, then let the server push changes
   fetchStatus();
+  subscribeToStatus();
 
   startStopBtn.addEventListener("click", function () {
     if (!isRunning) {
@@ -18,18 +25,31 @@ document.addEventListener("DOMContentLoaded", function () {
     }
   });
 
+  skeletonOnly.addEventListener("change", function () {
+    if (skeletonOnly.checked) {
+      showSkeleton();
+    } else {
+      showVideo();
+    }
+  });
+
+  // Ask for a stream no wider than the feed is displayed; the timestamp
+  // forces the browser to reconnect
+  function videoFeedUrl() {
+    const width = Math.round(videoFeed.clientWidth * (window.devicePixelRatio || 1));
+    return `/video_feed?width=${width}&t=${new Date().getTime()}`;
+  }
+
   function startDetection() {
     const exercise = exerciseType.value;
 
     // Show connection message while the camera starts
     document.getElementById("videoStatus").classList.remove("hidden");
 
-    // Get the video feed element
-    const videoFeed = document.getElementById("videoFeed");
-
-    // Force reload of the video feed by adding a timestamp
-    const timestamp = new Date().getTime();
-    videoFeed.src = `/video_feed?t=${timestamp}`;
+    // Force reload of the video feed
+    if (!skeletonOnly.checked) {
+      videoFeed.src = videoFeedUrl();
+    }
 
     // Log the video feed status
     console.log("Video feed source updated:", videoFeed.src);
@@ -45,7 +65,7 @@ document.addEventListener("DOMContentLoaded", function () {
       console.error("Error loading video feed");
       // Try reloading after a short delay
       setTimeout(() => {
-        videoFeed.src = `/video_feed?t=${new Date().getTime()}`;
+        if (!skeletonOnly.checked) videoFeed.src = videoFeedUrl();
       }, 2000);
     };
 
@@ -70,9 +90,11 @@ document.addEventListener("DOMContentLoaded", function () {
           document.getElementById("videoStatus").classList.add("hidden");
         }, 1500);
 
-        // Start polling for status updates
-        if (statusInterval) clearInterval(statusInterval);
-        statusInterval = setInterval(fetchStatus, 500);
+        // Fall back to polling for status updates without Server-Sent Events
+        if (!window.EventSource) {
+          if (statusInterval) clearInterval(statusInterval);
+          statusInterval = setInterval(fetchStatus, 500);
+        }
       })
       .catch((error) => {
         console.error("Error:", error);
@@ -105,36 +127,120 @@ document.addEventListener("DOMContentLoaded", function () {
       });
   }
 
+  // Landmark JSON instead of video: far less bandwidth, and the browser
+  // draws the skeleton itself
+  function showSkeleton() {
+    // Dropping the src closes the MJPEG connection
+    videoFeed.removeAttribute("src");
+    videoFeed.classList.add("hidden");
+    skeletonCanvas.classList.remove("hidden");
+    document.getElementById("videoStatus").classList.add("hidden");
+
+    landmarkEvents = new EventSource("/landmarks");
+    landmarkEvents.addEventListener("skeleton", function (event) {
+      connections = JSON.parse(event.data).connections;
+    });
+    landmarkEvents.addEventListener("landmarks", function (event) {
+      drawSkeleton(JSON.parse(event.data));
+    });
+  }
+
+  function showVideo() {
+    if (landmarkEvents) {
+      landmarkEvents.close();
+      landmarkEvents = null;
+    }
+    skeletonCanvas.classList.add("hidden");
+    videoFeed.classList.remove("hidden");
+    videoFeed.src = videoFeedUrl();
+  }
+
+  function drawSkeleton(data) {
+    const width = skeletonCanvas.clientWidth;
+    const height = skeletonCanvas.clientHeight;
+    if (skeletonCanvas.width !== width || skeletonCanvas.height !== height) {
+      skeletonCanvas.width = width;
+      skeletonCanvas.height = height;
+    }
+    const context = skeletonCanvas.getContext("2d");
+    context.clearRect(0, 0, width, height);
+    if (!data.landmarks) return;
+
+    // Landmarks are normalised [x, y, visibility] triples
+    const points = data.landmarks;
+    const visible = (point) => point[2] >= 0.5;
+    context.strokeStyle = "#e0e0e0";
+    context.lineWidth = 2;
+    context.beginPath();
+    for (const [start, end] of connections) {
+      if (visible(points[start]) && visible(points[end])) {
+        context.moveTo(points[start][0] * width, points[start][1] * height);
+        context.lineTo(points[end][0] * width, points[end][1] * height);
+      }
+    }
+    context.stroke();
+    context.fillStyle = "#ff0000";
+    for (const point of points) {
+      if (visible(point)) {
+        context.fillRect(point[0] * width - 2, point[1] * height - 2, 4, 4);
+      }
+    }
+  }
+
+  function subscribeToStatus() {
+    if (!window.EventSource) return;
+
+    // EventSource reconnects on its own if the connection drops
+    const events = new EventSource("/events");
+    events.addEventListener("status", function (event) {
+      updateStatus(JSON.parse(event.data));
+    });
+    events.addEventListener("alarm", function () {
+      feedbackLabel.classList.add("alarm");
+      setTimeout(() => feedbackLabel.classList.remove("alarm"), 2000);
+    });
+  }
+
   function fetchStatus() {
     fetch("/status")
       .then((response) => response.json())
-      .then((data) => {
-        isRunning = data.running;
-
-        if (isRunning) {
-          startStopBtn.innerText = "Stop";
-          startStopBtn.classList.add("stop");
-
-          // Update status displays
-          angleLabel.innerText = data.angle || "Angle: Not detected";
-
-          if (data.form_status === "good") {
-            feedbackLabel.innerText = data.feedback;
-            feedbackLabel.className = "status-label good";
-          } else if (data.form_status === "bad") {
-            feedbackLabel.innerText = data.feedback;
-            feedbackLabel.className = "status-label bad";
-          } else {
-            feedbackLabel.innerText = "";
-            feedbackLabel.className = "status-label";
-          }
-        } else {
-          startStopBtn.innerText = "Start";
-          startStopBtn.classList.remove("stop");
-        }
-      })
+      .then(updateStatus)
       .catch((error) => {
         console.error("Error:", error);
       });
   }
+
+  function formatReps(data) {
+    let text = "Reps: " + (data.reps || 0);
+    if (data.phase) text += " (" + data.phase + ")";
+    if (data.last_rep_time) text += " · " + data.last_rep_time.toFixed(1) + "s/rep";
+    return text;
+  }
+
+  function updateStatus(data) {
+    isRunning = data.running;
+
+    if (isRunning) {
+      startStopBtn.innerText = "Stop";
+      startStopBtn.classList.add("stop");
+
+      // Update status displays
+      angleLabel.innerText = data.angle || "Angle: Not detected";
+      repsLabel.innerText = formatReps(data);
+
+      if (data.form_status === "good") {
+        feedbackLabel.innerText = data.feedback;
+        feedbackLabel.className = "status-label good";
+      } else if (data.form_status === "bad") {
+        feedbackLabel.innerText = data.feedback;
+        feedbackLabel.className = "status-label bad";
+      } else {
+        feedbackLabel.innerText = "";
+        feedbackLabel.className = "status-label";
+      }
+    } else {
+      startStopBtn.innerText = "Start";
+      startStopBtn.classList.remove("stop");
+    }
+  }
 });
@@ -0,0 +1,286 @@
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from landmarks import POSE_CONNECTIONS
+from metrics import PipelineMetrics
+
+# Narrowest stream variant a client can ask for
+MIN_STREAM_WIDTH = 64
+
+
+def sse_message(event, data):
+    """One Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def landmark_message(snapshot, precision=3):
+    """Compact JSON for a client that draws the skeleton itself.
+
+    Landmarks are normalised (x, y, visibility) triples, so the client can
+    scale them to whatever size it displays.
+    """
+    landmarks = None
+    if snapshot.landmarks is not None:
+        landmarks = np.round(snapshot.landmarks[:, (0, 1, 3)].astype(np.float64), precision).tolist()
+    return {
+        "seq": snapshot.seq,
+        "landmarks": landmarks,
+        "angle": snapshot.angle,
+        "feedback": snapshot.feedback,
+        "form_status": snapshot.form_status,
+    }
+
+
+# Sent once before landmark messages so clients know which joints to connect
+SKELETON_MESSAGE = {"connections": [list(pair) for pair in POSE_CONNECTIONS]}
+
+
+class StreamVariant:
+    """One encoding of the stream (width, JPEG quality, frame-rate cap),
+    shared by every client that asked for it"""
+
+    def __init__(self, width, quality, fps):
+        self.width = width  # 0 keeps the published frame size
+        self.quality = quality
+        self.fps = fps  # 0 sends every frame
+        self.clients = 0
+        self.waiting = 0  # Clients ready for their next frame
+        self.seq = 0  # Ring sequence number of the frame in jpeg; -1 for the placeholder
+        self.version = 0  # Bumped for every encoded frame
+        self.jpeg = None
+        self.captured = None  # Capture timestamp of the frame in jpeg
+        self.last_encoded = 0.0
+        self.encoded = 0
+
+    @property
+    def due(self):
+        """perf_counter() time from which the next frame may be encoded"""
+        return self.last_encoded + 1.0 / self.fps if self.fps else 0.0
+
+    def size(self, shape):
+        """(width, height) to encode a frame of this shape at, or None to keep it"""
+        height, width = shape[:2]
+        if not self.width or self.width >= width:
+            return None
+        return self.width, max(1, round(height * self.width / width))
+
+    def stats(self):
+        return {
+            "width": self.width,
+            "quality": self.quality,
+            "fps": self.fps,
+            "clients": self.clients,
+            "encoded": self.encoded,
+        }
+
+
+class MJPEGBroadcaster:
+    """Encodes each new frame once per stream variant and fans the JPEG
+    bytes out to every /video_feed client.
+
+    Clients pick a variant with width, quality and fps parameters; clients
+    asking for the same (normalised) variant share its encodes. A single
+    encoder thread waits on the frame ring buffer and only encodes a
+    variant when at least one of its clients is ready for another frame
+    and its frame-rate cap allows it, so slow clients lower the encode rate
+    of their variant instead of piling up frames, and nothing is encoded
+    while the picture is not changing. Clients always pick up the newest
+    encoded frame, so a slow client simply skips frames without holding
+    anyone else up.
+    """
+
+    def __init__(self, get_ring, quality=80, placeholder_shape=(600, 800, 3), metrics=None, max_variants=4):
+        self.get_ring = get_ring  # Returns the current FrameRingBuffer, or None when stopped
+        self.quality = quality  # Default JPEG quality
+        self.placeholder_shape = placeholder_shape
+        # Further variants are served the default stream instead
+        self.max_variants = max_variants
+        # Encode time and capture-to-send latency
+        self.metrics = metrics or PipelineMetrics()
+        self._cond = threading.Condition()
+        self._thread = None
+        self.encoder_idle_timeout = 30.0  # Seconds without clients before the encoder exits
+        self._clients = 0
+        self._variants = {}
+        self.encoded = 0
+        self.sent = 0
+
+    def variant_key(self, width=None, quality=None, fps=None):
+        """Normalise requested stream parameters to a (width, quality, fps) key.
+
+        Widths snap to multiples of 32 and qualities to multiples of 5 so
+        similar requests share one variant.
+        """
+        width = 0 if not width else max(MIN_STREAM_WIDTH, int(width) // 32 * 32)
+        quality = self.quality if quality is None else min(max(int(quality) // 5 * 5, 10), 95)
+        fps = 0 if not fps else min(max(int(fps), 1), 60)
+        return width, quality, fps
+
+    def _ensure_encoder(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._encode_loop, name="mjpeg-encoder", daemon=True)
+                self._thread.start()
+
+    def _publish(self, variant, jpeg, seq, captured=None):
+        with self._cond:
+            variant.jpeg = jpeg
+            variant.seq = seq
+            variant.captured = captured
+            variant.version += 1
+            variant.last_encoded = time.perf_counter()
+            variant.encoded += 1
+            self.encoded += 1
+            self._cond.notify_all()
+
+    def _encode(self, frame, quality):
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer.tobytes() if ret else None
+
+    def _wait_for_ready(self, ring, timeout):
+        """Variants that should get the ring's newest frame, waiting up to timeout"""
+        deadline = time.perf_counter() + timeout
+        while True:
+            latest = ring.latest_seq
+            with self._cond:
+                now = time.perf_counter()
+                if now >= deadline or self._clients == 0:
+                    return []
+                waiting = [v for v in self._variants.values() if v.waiting]
+                stale = [v for v in waiting if v.seq < latest]
+                ready = [v for v in stale if now >= v.due]
+                if ready:
+                    return ready
+                if len(stale) < len(waiting):
+                    # Someone has the newest frame already; wait for the next
+                    # one, but no longer than a capped variant needs
+                    wait = min([deadline] + [v.due for v in stale]) - now
+                else:
+                    # Frame-rate caps, or every client is still sending its
+                    # last frame (clients notify when they are ready again)
+                    self._cond.wait(min([deadline] + [v.due for v in stale]) - now)
+                    continue
+            ring.wait(latest, timeout=wait)
+
+    def _encode_loop(self):
+        last_ring = None
+
+        while True:
+            with self._cond:
+                # Exit once nobody has watched for a while; the next client
+                # starts a new encoder
+                if not self._cond.wait_for(lambda: self._clients > 0, self.encoder_idle_timeout):
+                    self._thread = None
+                    return
+
+            try:
+                ring = self.get_ring()
+                if ring is None:
+                    # Detection stopped: show each variant a black frame once, then idle
+                    with self._cond:
+                        variants = [v for v in self._variants.values() if v.seq != -1]
+                    for variant in variants:
+                        placeholder = np.zeros(self.placeholder_shape, dtype=np.uint8)
+                        size = variant.size(placeholder.shape)
+                        if size is not None:
+                            placeholder = cv2.resize(placeholder, size)
+                        self._publish(variant, self._encode(placeholder, variant.quality), -1)
+                    last_ring = None
+                    time.sleep(0.1)
+                    continue
+
+                if ring is not last_ring:
+                    last_ring = ring
+                    with self._cond:
+                        for variant in self._variants.values():
+                            variant.seq = 0
+                ready = self._wait_for_ready(ring, timeout=0.5)
+                if not ready:
+                    continue
+
+                seq, frame = ring.latest()
+                captured = ring.timestamp(seq)
+                resized = {}  # Variants of the same width share the resize
+                for variant in ready:
+                    started = time.perf_counter()
+                    size = variant.size(frame.shape)
+                    image = frame
+                    if size is not None:
+                        image = resized.get(size)
+                        if image is None:
+                            image = resized[size] = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    jpeg = self._encode(image, variant.quality)
+                    # The slot was reused while encoding; try the newer frame
+                    if jpeg is None or not ring.is_current(seq):
+                        break
+                    self.metrics.since("encode", started)
+                    self._publish(variant, jpeg, seq, captured)
+            except Exception as e:
+                print(f"Error in MJPEG encoder: {e}")
+                time.sleep(0.1)
+
+    def frames(self, idle_timeout=None, width=None, quality=None, fps=None):
+        """Multipart MJPEG chunks for one client.
+
+        width, quality and fps select the stream variant (see
+        variant_key()). With idle_timeout, None is yielded whenever no new
+        frame arrived for that long so the consumer can check whether it
+        is still wanted.
+        """
+        key = self.variant_key(width, quality, fps)
+        with self._cond:
+            if key not in self._variants and len(self._variants) >= self.max_variants:
+                key = self.variant_key()
+            variant = self._variants.get(key)
+            if variant is None:
+                variant = self._variants[key] = StreamVariant(*key)
+            variant.clients += 1
+            self._clients += 1
+            self._cond.notify_all()
+        self._ensure_encoder()
+
+        version = 0
+        try:
+            while True:
+                with self._cond:
+                    # Tell the encoder this client can take another frame
+                    variant.waiting += 1
+                    self._cond.notify_all()
+                    changed = self._cond.wait_for(lambda: variant.version != version, idle_timeout)
+                    variant.waiting -= 1
+                    if changed:
+                        if version and variant.version > version + 1:
+                            # This client was too slow for the frames in between
+                            self.metrics.increment("frames_skipped_by_clients", variant.version - version - 1)
+                        version = variant.version
+                        jpeg = variant.jpeg
+                        captured = variant.captured
+                if not changed:
+                    yield None
+                    continue
+                if jpeg is None:
+                    continue
+                self.sent += 1
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+                # The generator resumes once the server has written the chunk
+                if captured is not None:
+                    self.metrics.since("end_to_end", captured)
+        finally:
+            with self._cond:
+                self._clients -= 1
+                variant.clients -= 1
+                if variant.clients == 0 and self._variants.get(key) is variant:
+                    del self._variants[key]
+
+    def has_clients(self):
+        return self._clients > 0
+
+    def stats(self):
+        with self._cond:
+            variants = [variant.stats() for variant in self._variants.values()]
+        return {"clients": self._clients, "encoded": self.encoded, "sent": self.sent, "variants": variants}